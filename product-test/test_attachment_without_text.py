@@ -8,8 +8,7 @@ that contain only file attachments without any accompanying text content.
 
 import os
 import sys
-import random
-import string
+import secrets
 
 # Set test encryption key before importing modules that need it
 if 'DECENTRA_ENCRYPTION_KEY' not in os.environ:
@@ -26,7 +25,7 @@ def hash_password(password):
 
 def generate_unique_suffix():
     """Generate a unique suffix for test data to avoid conflicts."""
-    return ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
+    return secrets.token_hex(4)
 
 def cleanup_test_data(db, usernames, server_ids):
     """Clean up test data from the database."""
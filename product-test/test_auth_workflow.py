@@ -9,6 +9,7 @@ This test verifies that:
 
 import sys
 import os
+import asyncio
 from datetime import datetime, timezone, timedelta
 
 # Set a fixed JWT secret key and encryption key for tests
@@ -37,20 +38,20 @@ def test_authentication_workflow():
     # Test Case 1: Password hashing
     print("\nTest 1: Password hashing")
     password = 'test_password_123'
-    password_hash = hash_password(password)
+    password_hash = asyncio.run(hash_password(password))
     assert password_hash is not None, "Password hash should not be None"
     assert password_hash != password, "Hash should be different from password"
     print("  ✓ Password hashing works")
     
     # Test Case 2: Verify correct password
     print("\nTest 2: Verify correct password")
-    is_valid = verify_password(password, password_hash)
+    is_valid = asyncio.run(verify_password(password, password_hash))
     assert is_valid, "Valid password should be accepted"
     print("  ✓ Correct password is accepted")
     
     # Test Case 3: Verify incorrect password
     print("\nTest 3: Verify incorrect password")
-    is_valid = verify_password('wrong_password', password_hash)
+    is_valid = asyncio.run(verify_password('wrong_password', password_hash))
     assert not is_valid, "Invalid password should be rejected"
     print("  ✓ Incorrect password is rejected")
     
@@ -87,13 +88,13 @@ def test_authentication_workflow():
     
     # Test Case 7: Test case sensitivity
     print("\nTest 7: Password case sensitivity")
-    is_valid = verify_password('TEST_PASSWORD_123', password_hash)
+    is_valid = asyncio.run(verify_password('TEST_PASSWORD_123', password_hash))
     assert not is_valid, "Passwords should be case-sensitive"
     print("  ✓ Passwords are case-sensitive")
     
     # Test Case 8: Test empty password
     print("\nTest 8: Empty password rejection")
-    is_valid = verify_password('', password_hash)
+    is_valid = asyncio.run(verify_password('', password_hash))
     assert not is_valid, "Empty password should be rejected"
     print("  ✓ Empty password is rejected")
     
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the encrypted token format and backward compatibility
+"""
+
+import os
+import sys
+import base64
+import unittest
+
+# Set test encryption key before importing modules that need it
+if 'DECENTRA_ENCRYPTION_KEY' not in os.environ:
+    os.environ['DECENTRA_ENCRYPTION_KEY'] = 'test-encryption-key-for-format-tests'
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+from encryption_utils import EncryptionManager
+
+
+class TestEncryptionFormat(unittest.TestCase):
+    """Test AES-GCM tokens and reading of data written by older versions."""
+
+    def setUp(self):
+        """Create an encryption manager for each test."""
+        self.manager = EncryptionManager()
+
+    def test_round_trip(self):
+        """Test that encrypted data decrypts to the original text."""
+        test_text = "Hello, wörld! 👋"
+        encrypted = self.manager.encrypt(test_text)
+
+        self.assertNotEqual(test_text, encrypted)
+        self.assertEqual(test_text, self.manager.decrypt(encrypted))
+        self.assertTrue(self.manager.is_encrypted(encrypted))
+
+        print("✓ Test passed: AES-GCM round trip works")
+
+    def test_bytes_round_trip(self):
+        """Test the bytes API, including bytes-like input from database drivers."""
+        token = self.manager.encrypt_bytes(b"binary \x00 payload")
+
+        self.assertEqual(b"binary \x00 payload", self.manager.decrypt_bytes(token))
+        self.assertEqual(b"binary \x00 payload", self.manager.decrypt_bytes(memoryview(token)))
+        self.assertEqual("text", self.manager.decrypt_bytes(
+            base64.urlsafe_b64decode(self.manager.encrypt("text"))).decode('utf-8'))
+
+        print("✓ Test passed: Bytes round trip works")
+
+    def test_nonces_are_unique(self):
+        """Test that nonces never repeat, including across counter rollover."""
+        nonces = {self.manager.encrypt_bytes(b"x")[1:13] for _ in range(100)}
+        self.manager._nonce_counter = 0xFFFFFFFF
+        nonces.add(self.manager.encrypt_bytes(b"x")[1:13])
+        nonces.add(self.manager.encrypt_bytes(b"x")[1:13])
+
+        self.assertEqual(102, len(nonces))
+
+        print("✓ Test passed: Nonces are unique")
+
+    def test_legacy_fernet_token_decrypts(self):
+        """Test that double-base64 Fernet tokens from older versions still decrypt."""
+        legacy_token = self.manager.fernet.encrypt("legacy secret".encode('utf-8'))
+        legacy = base64.urlsafe_b64encode(legacy_token).decode('utf-8')
+
+        self.assertEqual("legacy secret", self.manager.decrypt(legacy))
+        self.assertTrue(self.manager.is_encrypted(legacy))
+
+        print("✓ Test passed: Legacy Fernet tokens still decrypt")
+
+    def test_plaintext_passthrough(self):
+        """Test that plaintext data is returned unchanged and not reported as encrypted."""
+        self.assertEqual("plain text", self.manager.decrypt("plain text"))
+        self.assertFalse(self.manager.is_encrypted("plain text"))
+        self.assertEqual('', self.manager.encrypt(''))
+        self.assertEqual('', self.manager.decrypt(''))
+
+        print("✓ Test passed: Plaintext data passes through")
+
+
+def main():
+    """Run the tests."""
+    print("Testing Encryption Format")
+    print("=" * 50)
+
+    # Run the tests
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestEncryptionFormat)
+    runner = unittest.TextTestRunner(verbosity=2)
+    result = runner.run(suite)
+
+    print("\n" + "=" * 50)
+    if result.wasSuccessful():
+        print("All encryption format tests passed!")
+        return 0
+    else:
+        print("Some tests failed!")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
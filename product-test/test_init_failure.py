@@ -9,11 +9,13 @@ leaving the client in a broken state.
 """
 
 import os
+import re
+import mmap
 import sys
+import secrets
 import json
 import asyncio
-import random
-import string
+import functools
 import websockets
 import ssl
 import traceback
@@ -28,13 +30,51 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
 from database import Database
 import bcrypt
 
+# SSL context that doesn't verify certificates (for testing), shared by all connections
+SSL_CTX = ssl.create_default_context()
+SSL_CTX.check_hostname = False
+SSL_CTX.verify_mode = ssl.CERT_NONE
+
+# Code fragments the init-failure handling in server.py must contain, by check name
+SERVER_CODE_PATTERNS = {
+    'servers_null_check': 'build_user_servers_data(username) or []',
+    'dms_null_check': 'build_user_dms_data(username) or []',
+    'admin_settings_null_check': 'db.get_admin_settings() or {}',
+    'try_block': 'try:',
+    'init_servers_build': 'user_servers = build_user_servers_data',
+    'exception_handler': 'except Exception as e:',
+    'init_failure_log': 'Failed to send init message',
+    'error_type': "'type': 'error'",
+    'error_message': 'Connection error. Please refresh',
+    'traceback_log': 'logger.exception("Failed to send init message',
+}
+
+# One alternation of named groups scanned in a single pass; the lookahead lets
+# overlapping fragments (e.g. init_servers_build and servers_null_check) both
+# be found
+_SERVER_CODE_RE = re.compile(
+    b'(?=' + b'|'.join(
+        b'(?P<' + name.encode('ascii') + b'>' + re.escape(pattern.encode('utf-8')) + b')'
+        for name, pattern in SERVER_CODE_PATTERNS.items()
+    ) + b')'
+)
+
+def find_server_code_patterns(server_file):
+    """Return {check name: offset of first match} for the SERVER_CODE_PATTERNS found in the file."""
+    found = {}
+    # Scan the memory-mapped bytes directly rather than reading and decoding the whole file
+    with open(server_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for m in _SERVER_CODE_RE.finditer(mm):
+            found.setdefault(m.lastgroup, m.start())
+    return found
+
 def hash_password(password):
     """Hash a password using bcrypt."""
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
 def generate_unique_suffix():
     """Generate a unique suffix for test data to avoid conflicts."""
-    return ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
+    return secrets.token_hex(4)
 
 def cleanup_test_data(db, usernames):
     """Clean up test data from the database."""
@@ -44,32 +84,26 @@ def cleanup_test_data(db, usernames):
             cursor = conn.cursor()
             
             # Delete users (cascades to related data)
-            for username in usernames:
-                cursor.execute('DELETE FROM users WHERE username = %s', (username,))
+            cursor.execute('DELETE FROM users WHERE username = ANY(%s::text[])', (usernames,))
             
             conn.commit()
         print("✓ Test data cleaned up")
     except Exception as e:
         print(f"⚠ Cleanup warning: {e}")
 
+@functools.lru_cache(maxsize=64)
+def auth_frame(username, password):
+    """Build the encoded auth message, cached per credentials for repeated connects."""
+    return json.dumps({"type": "login", "username": username, "password": password})
+
 async def connect_websocket_and_auth(username, password):
     """Connect to WebSocket and attempt authentication."""
-    # Create SSL context that doesn't verify certificates (for testing)
-    ssl_context = ssl.create_default_context()
-    ssl_context.check_hostname = False
-    ssl_context.verify_mode = ssl.CERT_NONE
-    
     # Connect to WebSocket
     uri = "wss://localhost:8765/ws"
-    websocket = await websockets.connect(uri, ssl=ssl_context)
+    websocket = await websockets.connect(uri, ssl=SSL_CTX)
     
     # Authenticate
-    auth_msg = {
-        "type": "auth",
-        "username": username,
-        "password": password
-    }
-    await websocket.send(json.dumps(auth_msg))
+    await websocket.send(auth_frame(username, password))
     
     return websocket
 
@@ -105,8 +139,12 @@ async def test_init_failure_error_handling():
         ws = await connect_websocket_and_auth(test_username, password)
         print("✓ WebSocket connected and authenticated")
         
-        # Should receive init message
-        response = await asyncio.wait_for(ws.recv(), timeout=5.0)
+        # Should receive auth_success followed by the init message
+        async with asyncio.timeout(5.0):
+            auth_response = json.loads(await ws.recv())
+            assert auth_response.get('type') == 'auth_success', \
+                f"Expected auth_success, got {auth_response.get('type')}: {auth_response.get('message')}"
+            response = await ws.recv()
         response_data = json.loads(response)
         
         assert response_data.get('type') == 'init', f"Expected init message, got {response_data.get('type')}"
@@ -141,15 +179,14 @@ async def test_init_failure_error_handling():
         
         # Read the server code to verify defensive checks
         server_file = os.path.join(os.path.dirname(__file__), '..', 'server', 'server.py')
-        with open(server_file, 'r') as f:
-            server_code = f.read()
+        found = find_server_code_patterns(server_file)
         
         # Check for defensive null checks
-        assert 'build_user_servers_data(username) or []' in server_code, \
+        assert 'servers_null_check' in found, \
             "Missing defensive check for user_servers"
-        assert 'build_user_dms_data(username) or []' in server_code, \
+        assert 'dms_null_check' in found, \
             "Missing defensive check for user_dms"
-        assert 'db.get_admin_settings() or {}' in server_code, \
+        assert 'admin_settings_null_check' in found, \
             "Missing defensive check for admin_settings"
         
         print("✓ Defensive null checks verified:")
@@ -163,13 +200,13 @@ async def test_init_failure_error_handling():
         print("-" * 60)
         
         # Check that the error handling wraps the entire init block
-        assert 'try:' in server_code and 'user_servers = build_user_servers_data' in server_code, \
+        assert 'try_block' in found and 'init_servers_build' in found, \
             "Init sequence should be wrapped in try block"
-        assert 'except Exception as e:' in server_code and 'Failed to send init message' in server_code, \
+        assert 'exception_handler' in found and 'init_failure_log' in found, \
             "Should have exception handler for init failures"
-        assert "'type': 'error'" in server_code and 'Connection error. Please refresh' in server_code, \
+        assert 'error_type' in found and 'error_message' in found, \
             "Should send error message to client"
-        assert 'traceback.print_exc()' in server_code, \
+        assert 'traceback_log' in found, \
             "Should log traceback for debugging"
         
         print("✓ Error handling structure verified:")
@@ -5,8 +5,7 @@ Test script to verify message edit and delete functionality
 
 import os
 import sys
-import random
-import string
+import secrets
 
 # Set test encryption key before importing modules that need it
 if 'DECENTRA_ENCRYPTION_KEY' not in os.environ:
@@ -22,7 +21,7 @@ def hash_password(password):
 
 def generate_unique_suffix():
     """Generate a unique suffix for test data to avoid conflicts."""
-    return ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
+    return secrets.token_hex(4)
 
 def cleanup_test_data(db, usernames, server_ids):
     """Clean up test data from the database."""
@@ -9,12 +9,13 @@ attachment correlation.
 
 import os
 import sys
-import json
+import secrets
+import orjson
 import asyncio
-import random
-import string
+import functools
 import websockets
 import ssl
+from datetime import datetime
 
 # Set test encryption key before importing modules that need it
 if 'DECENTRA_ENCRYPTION_KEY' not in os.environ:
@@ -25,13 +26,54 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
 from database import Database
 import bcrypt
 
+# SSL context that doesn't verify certificates (for testing), shared by all connections
+SSL_CTX = ssl.create_default_context()
+SSL_CTX.check_hostname = False
+SSL_CTX.verify_mode = ssl.CERT_NONE
+
 def hash_password(password):
-    """Hash a password using bcrypt."""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    """Hash a password using bcrypt (minimum cost; test users need no brute-force resistance)."""
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=4)).decode('utf-8')
+
+def encode_message(data):
+    """Serialize a message for the WebSocket (the server only accepts text frames)."""
+    return orjson.dumps(data).decode('utf-8')
 
 def generate_unique_suffix():
     """Generate a unique suffix for test data to avoid conflicts."""
-    return ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
+    return secrets.token_hex(4)
+
+def setup_test_data(db, alice_username, bob_username, password_hash, server_id, channel_id, dm_id):
+    """Create the test users, server, channel and DM in a single transaction."""
+    now = datetime.now()
+    user1, user2 = sorted([alice_username, bob_username])
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            INSERT INTO users (username, password_hash, created_at)
+            VALUES (%s, %s, %s), (%s, %s, %s)
+        ''', (alice_username, password_hash, now, bob_username, password_hash, now))
+        
+        # Alice owns the server; both users are members
+        cursor.execute('''
+            INSERT INTO servers (server_id, name, owner)
+            VALUES (%s, %s, %s)
+        ''', (server_id, "Test Server", alice_username))
+        cursor.execute('''
+            INSERT INTO server_members (server_id, username)
+            VALUES (%s, %s), (%s, %s)
+        ''', (server_id, alice_username, server_id, bob_username))
+        cursor.execute('''
+            INSERT INTO channels (channel_id, server_id, name, type)
+            VALUES (%s, %s, %s, %s)
+        ''', (channel_id, server_id, "general", "text"))
+        
+        # DM participants are stored in sorted order
+        cursor.execute('''
+            INSERT INTO direct_messages (dm_id, user1, user2, created_at)
+            VALUES (%s, %s, %s, %s)
+        ''', (dm_id, user1, user2, now))
 
 def cleanup_test_data(db, usernames, server_ids, dm_ids):
     """Clean up test data from the database."""
@@ -40,59 +82,110 @@ def cleanup_test_data(db, usernames, server_ids, dm_ids):
         with db.get_connection() as conn:
             cursor = conn.cursor()
             
-            # Delete messages for test servers
-            for server_id in server_ids:
-                cursor.execute("DELETE FROM messages WHERE context_id = %s OR context_id LIKE %s", 
-                              (server_id, server_id + '/%'))
-            
-            # Delete DM messages
-            for dm_id in dm_ids:
-                cursor.execute("DELETE FROM messages WHERE context_id = %s", (dm_id,))
-            
-            # Delete DMs
-            for dm_id in dm_ids:
-                cursor.execute('DELETE FROM direct_messages WHERE dm_id = %s', (dm_id,))
-            
-            # Delete servers (cascades to channels and server_members)
-            for server_id in server_ids:
-                cursor.execute('DELETE FROM servers WHERE server_id = %s', (server_id,))
-            
-            # Delete users (cascades to related data)
-            for username in usernames:
-                cursor.execute('DELETE FROM users WHERE username = %s', (username,))
+            # Send all deletes in a single round-trip, in dependency order:
+            # messages for test servers and DMs, then DMs, then servers
+            # (cascades to channels and server_members), then users
+            # (cascades to related data)
+            cursor.execute("""
+                DELETE FROM messages
+                    WHERE context_id = ANY(%(context_ids)s::text[])
+                       OR context_id LIKE ANY(%(server_patterns)s::text[]);
+                DELETE FROM direct_messages WHERE dm_id = ANY(%(dm_ids)s::text[]);
+                DELETE FROM servers WHERE server_id = ANY(%(server_ids)s::text[]);
+                DELETE FROM users WHERE username = ANY(%(usernames)s::text[]);
+            """, {
+                'context_ids': server_ids + dm_ids,
+                'server_patterns': [server_id + '/%' for server_id in server_ids],
+                'dm_ids': dm_ids,
+                'server_ids': server_ids,
+                'usernames': usernames
+            })
             
             conn.commit()
         print("✓ Test data cleaned up")
     except Exception as e:
         print(f"⚠ Cleanup warning: {e}")
 
+class WsClient:
+    """WebSocket wrapper whose outgoing frames are written by one background sender task."""
+    
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self._queue = asyncio.Queue()
+        self._sender = asyncio.create_task(self._send_loop())
+    
+    async def _send_loop(self):
+        """Write queued frames to the socket for the lifetime of the connection."""
+        while True:
+            frame = await self._queue.get()
+            try:
+                await self.websocket.send(frame)
+            finally:
+                self._queue.task_done()
+    
+    def _check_sender(self):
+        """Re-raise the error that stopped the sender task, if it failed."""
+        if self._sender.done() and not self._sender.cancelled() and self._sender.exception():
+            raise self._sender.exception()
+    
+    def send_nowait(self, data):
+        """Queue a message for sending without waiting for the write."""
+        self._queue.put_nowait(encode_message(data))
+    
+    async def recv_json(self, msg_type=None, timeout=5.0):
+        """Receive and decode the next message, skipping frames of other types if msg_type is given."""
+        self._check_sender()
+        try:
+            async with asyncio.timeout(timeout):
+                while True:
+                    data = orjson.loads(await self.websocket.recv())
+                    if msg_type is None or data.get('type') == msg_type:
+                        return data
+        except TimeoutError:
+            # A failed send means the reply being waited for was never triggered
+            self._check_sender()
+            raise
+    
+    async def close(self, timeout=5.0):
+        """Flush queued frames, stop the sender and close the socket."""
+        flushed = asyncio.ensure_future(self._queue.join())
+        try:
+            # A dead sender never drains the queue, so stop waiting as soon as it exits
+            await asyncio.wait((flushed, self._sender), timeout=timeout,
+                               return_when=asyncio.FIRST_COMPLETED)
+            self._check_sender()
+            if not flushed.done():
+                raise TimeoutError(f"Queued frames were not sent within {timeout}s")
+        finally:
+            flushed.cancel()
+            self._sender.cancel()
+            await self.websocket.close()
+
+@functools.lru_cache(maxsize=64)
+def auth_frame(username, password):
+    """Build the encoded auth message, cached per credentials for repeated connects."""
+    return encode_message({"type": "login", "username": username, "password": password})
+
 async def connect_websocket(username, password):
     """Connect to the WebSocket server and authenticate."""
-    # Create SSL context that doesn't verify certificates (for testing)
-    ssl_context = ssl.create_default_context()
-    ssl_context.check_hostname = False
-    ssl_context.verify_mode = ssl.CERT_NONE
-    
     # Connect to WebSocket
     uri = "wss://localhost:8765/ws"
-    websocket = await websockets.connect(uri, ssl=ssl_context)
+    websocket = await websockets.connect(uri, ssl=SSL_CTX)
     
     # Authenticate
-    auth_msg = {
-        "type": "auth",
-        "username": username,
-        "password": password
-    }
-    await websocket.send(json.dumps(auth_msg))
+    await websocket.send(auth_frame(username, password))
     
-    # Wait for auth response
-    response = await websocket.recv()
-    response_data = json.loads(response)
+    # Wait for auth response, skipping broadcasts (e.g. the other user joining)
+    # that the server delivers to connections that are still authenticating
+    while True:
+        response_data = orjson.loads(await websocket.recv())
+        if response_data.get('type') in ('auth_success', 'auth_error', '2fa_required'):
+            break
     
     if response_data.get('type') != 'auth_success':
         raise Exception(f"Authentication failed: {response_data}")
     
-    return websocket
+    return WsClient(websocket)
 
 async def test_messagekey_passthrough():
     """Test messageKey extraction and passthrough in all contexts."""
@@ -118,32 +211,23 @@ async def test_messagekey_passthrough():
     dm_ids = [dm_id]
     
     try:
-        # Create test users
-        print("\nSetup: Creating test users...")
+        # Create test users, server, channel and DM with a single commit
+        print("\nSetup: Creating test users, server, channel and DM...")
         password = "testpass123"
-        assert db.create_user(alice_username, hash_password(password)), "Failed to create alice"
-        assert db.create_user(bob_username, hash_password(password)), "Failed to create bob"
-        print("✓ Test users created")
-        
-        # Create server and channel for testing
-        print("\nSetup: Creating server and channel...")
-        assert db.create_server(server_id, "Test Server", alice_username), "Failed to create server"
-        assert db.create_channel(channel_id, server_id, "general", "text"), "Failed to create channel"
-        assert db.add_server_member(server_id, bob_username), "Failed to add bob to server"
-        print("✓ Server and channel created")
-        
-        # Create DM for testing
-        print("\nSetup: Creating DM...")
-        assert db.create_dm(alice_username, bob_username, dm_id), "Failed to create DM"
-        print("✓ DM created")
+        password_hash = hash_password(password)
+        setup_test_data(db, alice_username, bob_username, password_hash, server_id, channel_id, dm_id)
+        print("✓ Test users, server, channel and DM created")
         
         # Test 1: Server channel message with messageKey
         print("\n" + "=" * 60)
         print("Test 1: Server channel message with messageKey")
         print("-" * 60)
         
-        alice_ws = await connect_websocket(alice_username, password)
-        bob_ws = await connect_websocket(bob_username, password)
+        # Connect both users concurrently so the handshakes overlap
+        alice_ws, bob_ws = await asyncio.gather(
+            connect_websocket(alice_username, password),
+            connect_websocket(bob_username, password)
+        )
         print("✓ WebSocket connections established")
         
         # Alice sends a message with messageKey
@@ -155,12 +239,11 @@ async def test_messagekey_passthrough():
             "context_id": f"{server_id}/{channel_id}",
             "messageKey": test_message_key_1
         }
-        await alice_ws.send(json.dumps(message_data_1))
+        alice_ws.send_nowait(message_data_1)
         print(f"✓ Alice sent message with messageKey: {test_message_key_1[:30]}...")
         
-        # Alice should receive her own message with messageKey
-        alice_received = await asyncio.wait_for(alice_ws.recv(), timeout=5.0)
-        alice_msg = json.loads(alice_received)
+        # Alice should receive her own message and Bob the broadcast, both with messageKey
+        alice_msg, bob_msg = await asyncio.gather(alice_ws.recv_json('message'), bob_ws.recv_json('message'))
         
         assert alice_msg.get('type') == 'message', f"Expected message type, got {alice_msg.get('type')}"
         assert alice_msg.get('username') == alice_username, "Username doesn't match"
@@ -170,10 +253,6 @@ async def test_messagekey_passthrough():
         assert 'id' in alice_msg, "Message ID not found"
         print(f"✓ Alice received her message with correct messageKey")
         
-        # Bob should also receive the message with messageKey
-        bob_received = await asyncio.wait_for(bob_ws.recv(), timeout=5.0)
-        bob_msg = json.loads(bob_received)
-        
         assert bob_msg.get('messageKey') == test_message_key_1, "Bob should see same messageKey"
         print(f"✓ Bob received message with correct messageKey")
         
@@ -190,12 +269,11 @@ async def test_messagekey_passthrough():
             "context_id": dm_id,
             "messageKey": test_message_key_2
         }
-        await alice_ws.send(json.dumps(message_data_2))
+        alice_ws.send_nowait(message_data_2)
         print(f"✓ Alice sent DM with messageKey: {test_message_key_2[:30]}...")
         
-        # Alice should receive her own DM with messageKey
-        alice_dm_received = await asyncio.wait_for(alice_ws.recv(), timeout=5.0)
-        alice_dm_msg = json.loads(alice_dm_received)
+        # Alice should receive her own DM and Bob the DM, both with messageKey
+        alice_dm_msg, bob_dm_msg = await asyncio.gather(alice_ws.recv_json('message'), bob_ws.recv_json('message'))
         
         assert alice_dm_msg.get('type') == 'message', "Expected message type"
         assert alice_dm_msg.get('content') == "Hello from DM", "DM content doesn't match"
@@ -204,10 +282,6 @@ async def test_messagekey_passthrough():
         assert 'id' in alice_dm_msg, "Message ID not found in DM"
         print(f"✓ Alice received her DM with correct messageKey")
         
-        # Bob should also receive the DM with messageKey
-        bob_dm_received = await asyncio.wait_for(bob_ws.recv(), timeout=5.0)
-        bob_dm_msg = json.loads(bob_dm_received)
-        
         assert bob_dm_msg.get('messageKey') == test_message_key_2, "Bob should see same DM messageKey"
         print(f"✓ Bob received DM with correct messageKey")
         
@@ -223,12 +297,11 @@ async def test_messagekey_passthrough():
             "context_id": f"{server_id}/{channel_id}"
             # No messageKey field
         }
-        await alice_ws.send(json.dumps(message_data_3))
+        alice_ws.send_nowait(message_data_3)
         print("✓ Alice sent message without messageKey")
         
         # Alice should receive message without messageKey
-        alice_no_key = await asyncio.wait_for(alice_ws.recv(), timeout=5.0)
-        alice_no_key_msg = json.loads(alice_no_key)
+        alice_no_key_msg = await alice_ws.recv_json('message')
         
         assert alice_no_key_msg.get('type') == 'message', "Expected message type"
         assert alice_no_key_msg.get('content') == "Message without key", "Content doesn't match"
@@ -248,8 +321,7 @@ async def test_messagekey_passthrough():
         print(f"✓ Message correctly stored in database with ID: {alice_msg['id']}")
         
         # Close WebSocket connections
-        await alice_ws.close()
-        await bob_ws.close()
+        await asyncio.gather(alice_ws.close(), bob_ws.close())
         print("\n✓ WebSocket connections closed")
         
         print("\n" + "=" * 60)
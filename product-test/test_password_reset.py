@@ -45,6 +45,7 @@ def test_password_reset():
         # Mark token as used
         mark_result = db.mark_reset_token_used(reset_token)
         assert mark_result, "Failed to mark token as used"
+        assert not db.mark_reset_token_used(reset_token), "A used token should not be redeemable again"
         
         # Verify token is marked as used
         used_token_data = db.get_password_reset_token(reset_token)
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Test script for server helper functions.
+This test verifies that:
+1. Broadcast fan-out reaches every client, in batches, and reaps failed sockets
+2. Invite codes have the configured length and only use the invite code alphabet
+3. The cached history frame is reused until a message is added, then rebuilt
+"""
+
+import sys
+import os
+import asyncio
+import string
+import json
+from unittest.mock import patch
+
+# Set a fixed JWT secret key and encryption key for tests
+os.environ['JWT_SECRET_KEY'] = 'test-jwt-secret-key-for-server-helpers-testing'
+os.environ['DECENTRA_ENCRYPTION_KEY'] = 'test-encryption-key-for-server-helpers-testing'
+
+# Add server directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+# Mock the database and other dependencies to prevent connection attempts during import
+from unittest.mock import MagicMock
+sys.modules['database'] = MagicMock()
+sys.modules['api'] = MagicMock()
+sys.modules['email_utils'] = MagicMock()
+sys.modules['ssl_utils'] = MagicMock()
+
+# Import helpers from server
+import server
+from server import send_to_clients, BROADCAST_BATCH_SIZE, generate_invite_code, INVITE_CODE_LENGTH
+from server import add_to_history, get_history_frame, to_json, MAX_HISTORY
+
+
+class FakeWebSocket:
+    """Stand-in for a client websocket that records sends, or fails them."""
+
+    in_flight = 0
+    max_in_flight = 0
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.sent = []
+
+    async def send_str(self, data):
+        FakeWebSocket.in_flight += 1
+        FakeWebSocket.max_in_flight = max(FakeWebSocket.max_in_flight, FakeWebSocket.in_flight)
+        try:
+            # Yield once so every send in a batch is pending at the same time
+            await asyncio.sleep(0)
+            if self.fail:
+                raise ConnectionResetError('Cannot write to closing transport')
+            self.sent.append(data)
+        finally:
+            FakeWebSocket.in_flight -= 1
+
+
+def test_send_to_clients():
+    """Test broadcast fan-out."""
+    print("Testing send_to_clients")
+    print("=" * 60)
+
+    # Test Case 1: Every healthy client receives the message
+    print("\nTest 1: Every healthy client receives the message")
+    healthy = [FakeWebSocket() for _ in range(3)]
+    server.clients.clear()
+    server.clients.update({ws: f'user{i}' for i, ws in enumerate(healthy)})
+    asyncio.run(send_to_clients(list(server.clients), 'hello'))
+    assert all(ws.sent == ['hello'] for ws in healthy), "Every client should receive the message once"
+    print("  ✓ Message delivered to every client")
+
+    # Test Case 2: Failed sockets are reaped
+    print("\nTest 2: Clients whose send fails are removed")
+    broken = FakeWebSocket(fail=True)
+    server.clients[broken] = 'broken_user'
+    asyncio.run(send_to_clients(list(server.clients), 'again'))
+    assert broken not in server.clients, "Failed client should be removed from clients"
+    assert all(ws in server.clients for ws in healthy), "Healthy clients should stay connected"
+    assert all(ws.sent == ['hello', 'again'] for ws in healthy), \
+        "A failed send should not stop delivery to the others"
+    print("  ✓ Failed client reaped, healthy clients kept")
+
+    # Test Case 3: Large fan-outs are batched
+    print(f"\nTest 3: Fan-out above BROADCAST_BATCH_SIZE ({BROADCAST_BATCH_SIZE}) is batched")
+    many = [FakeWebSocket() for _ in range(BROADCAST_BATCH_SIZE * 2 + 1)]
+    many[BROADCAST_BATCH_SIZE + 1].fail = True
+    server.clients.clear()
+    server.clients.update({ws: f'user{i}' for i, ws in enumerate(many)})
+    FakeWebSocket.max_in_flight = 0
+    asyncio.run(send_to_clients(list(server.clients), 'batched'))
+    assert FakeWebSocket.max_in_flight == BROADCAST_BATCH_SIZE, \
+        f"At most {BROADCAST_BATCH_SIZE} sends should be pending at once, saw {FakeWebSocket.max_in_flight}"
+    assert sum(ws.sent == ['batched'] for ws in many) == len(many) - 1, \
+        "Every healthy client across all batches should receive the message"
+    assert many[BROADCAST_BATCH_SIZE + 1] not in server.clients, "Failed client in a later batch should be reaped"
+    assert len(server.clients) == len(many) - 1, "Only the failed client should be removed"
+    print("  ✓ Sends are batched and failures in later batches are reaped")
+    server.clients.clear()
+
+    print("\n" + "=" * 60)
+    print("✅ All send_to_clients tests passed!")
+    return True
+
+
+def test_generate_invite_code():
+    """Test invite code generation."""
+    print("Testing generate_invite_code")
+    print("=" * 60)
+
+    # Test Case 1: Length and alphabet
+    print("\nTest 1: Codes have the configured length and alphabet")
+    allowed = set(string.ascii_uppercase + string.digits)
+    codes = [generate_invite_code() for _ in range(500)]
+    for code in codes:
+        assert isinstance(code, str), f"Invite code should be a str, got {type(code)}"
+        assert len(code) == INVITE_CODE_LENGTH, f"Expected {INVITE_CODE_LENGTH} characters, got {code!r}"
+        assert set(code) <= allowed, f"Invite code has characters outside A-Z0-9: {code!r}"
+    print(f"  ✓ 500 codes of {INVITE_CODE_LENGTH} characters from A-Z0-9")
+
+    # Test Case 2: The whole alphabet is reachable
+    print("\nTest 2: Every character of the alphabet is used")
+    seen = set(''.join(codes))
+    assert seen == allowed, f"Characters never generated: {sorted(allowed - seen)}"
+    assert len(set(codes)) == len(codes), "Codes should not repeat"
+    print("  ✓ All 36 characters appear and codes are unique")
+
+    # Test Case 3: Biased bytes are rejected
+    print("\nTest 3: Bytes >= 252 are rejected instead of wrapping around")
+    draws = iter([bytes([255, 252, 0, 35, 36, 251] + [253] * 6), bytes(range(12))])
+    with patch.object(server.secrets, 'token_bytes', lambda n: next(draws)):
+        code = generate_invite_code()
+    assert code == 'A9A9ABCD', f"Rejected bytes should be skipped and the code topped up, got {code!r}"
+    print("  ✓ Out-of-range bytes are skipped and the code is topped up")
+
+    print("\n" + "=" * 60)
+    print("✅ All generate_invite_code tests passed!")
+    return True
+
+
+def test_history_frame():
+    """Test the cached history frame."""
+    print("Testing get_history_frame / add_to_history")
+    print("=" * 60)
+
+    server.messages.clear()
+    server.history_frame = None
+
+    # Test Case 1: Empty history
+    print("\nTest 1: Empty history encodes an empty list")
+    assert json.loads(get_history_frame()) == {'type': 'history', 'messages': []}, \
+        "Empty history should produce an empty messages list"
+    print("  ✓ Empty history frame is valid JSON")
+
+    # Test Case 2: Frame is cached
+    print("\nTest 2: Frame is reused while history is unchanged")
+    first = {'type': 'message', 'username': 'alice', 'content': 'hi "there"'}
+    add_to_history(to_json(first))
+    frame = get_history_frame()
+    assert get_history_frame() is frame, "Unchanged history should return the cached frame"
+    assert json.loads(frame) == {'type': 'history', 'messages': [first]}, \
+        f"Frame should contain the added message, got {frame}"
+    print("  ✓ Same frame object returned until history changes")
+
+    # Test Case 3: Adding a message invalidates the cache
+    print("\nTest 3: add_to_history invalidates the cached frame")
+    second = {'type': 'message', 'username': 'bob', 'content': 'hello'}
+    add_to_history(to_json(second))
+    rebuilt = get_history_frame()
+    assert rebuilt is not frame, "Adding a message should rebuild the frame"
+    assert json.loads(rebuilt)['messages'] == [first, second], \
+        "Rebuilt frame should contain every message in order"
+    print("  ✓ Frame rebuilt with the new message")
+
+    # Test Case 4: Rebuilt frame follows the history limit
+    print(f"\nTest 4: Frame holds at most MAX_HISTORY ({MAX_HISTORY}) messages")
+    for i in range(MAX_HISTORY + 5):
+        add_to_history(to_json({'type': 'message', 'username': 'carol', 'content': str(i)}))
+    history = json.loads(get_history_frame())['messages']
+    assert len(history) == MAX_HISTORY, f"Expected {MAX_HISTORY} messages, got {len(history)}"
+    assert history[0]['content'] == '5' and history[-1]['content'] == str(MAX_HISTORY + 4), \
+        "Oldest messages should be dropped from the frame"
+    print("  ✓ Oldest messages dropped from the rebuilt frame")
+
+    server.messages.clear()
+    server.history_frame = None
+
+    print("\n" + "=" * 60)
+    print("✅ All history frame tests passed!")
+    return True
+
+
+if __name__ == '__main__':
+    try:
+        success = all(test() for test in (test_send_to_clients, test_generate_invite_code, test_history_frame))
+        sys.exit(0 if success else 1)
+    except AssertionError as e:
+        print(f"\n❌ FAIL: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
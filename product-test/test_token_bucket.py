@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test script for the per-connection rate limiter.
+This test verifies that:
+1. A full bucket allows a burst of messages and then rejects
+2. Tokens refill at the configured rate, up to the burst size
+3. WebRTC signaling messages have their own, larger budget
+"""
+
+import sys
+import os
+
+# Set a fixed JWT secret key and encryption key for tests
+os.environ['JWT_SECRET_KEY'] = 'test-jwt-secret-key-for-token-bucket-testing'
+os.environ['DECENTRA_ENCRYPTION_KEY'] = 'test-encryption-key-for-token-bucket-testing'
+
+# Add server directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+# Mock the database and other dependencies to prevent connection attempts during import
+from unittest.mock import MagicMock, patch
+sys.modules['database'] = MagicMock()
+sys.modules['api'] = MagicMock()
+sys.modules['email_utils'] = MagicMock()
+sys.modules['ssl_utils'] = MagicMock()
+
+# Import the rate limiter from server
+import server
+from server import TokenBucket
+
+
+class FakeClock:
+    """Stand-in for time.monotonic that only moves when told to."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket():
+    """Test the token bucket rate limiter."""
+    print("Testing Token Bucket Rate Limiter")
+    print("=" * 60)
+
+    clock = FakeClock()
+    with patch.object(server.time, 'monotonic', clock):
+        # Test Case 1: Burst then reject
+        print("\nTest 1: Full bucket allows a burst, then rejects")
+        bucket = TokenBucket(rate=8, burst=5)
+        results = [bucket.consume() for _ in range(6)]
+        assert results == [True] * 5 + [False], f"Expected 5 allowed then rejected, got {results}"
+        print("  ✓ Burst of 5 allowed, 6th rejected")
+
+        # Test Case 2: Refill at the configured rate
+        print("\nTest 2: Tokens refill at the configured rate")
+        clock.now += 0.125  # One token at 8/s
+        assert bucket.consume(), "One token should have refilled after 0.125s"
+        assert not bucket.consume(), "Only one token should have refilled"
+        print("  ✓ One token refilled after 0.125s")
+
+        # Test Case 3: Refill is capped at the burst size
+        print("\nTest 3: Refill is capped at the burst size")
+        clock.now += 60
+        results = [bucket.consume() for _ in range(6)]
+        assert results == [True] * 5 + [False], f"Refill should cap at burst size, got {results}"
+        print("  ✓ Long idle period refills only up to the burst size")
+
+        # Test Case 4: Partial tokens accumulate
+        print("\nTest 4: Partial tokens accumulate across calls")
+        clock.now += 0.0625
+        assert not bucket.consume(), "Half a token should not be enough"
+        clock.now += 0.0625
+        assert bucket.consume(), "Two half tokens should add up to one"
+        print("  ✓ Fractional refills accumulate")
+
+    # Test Case 5: Signaling budget
+    print("\nTest 5: WebRTC signaling has its own budget")
+    for msg_type in ('webrtc_offer', 'webrtc_answer', 'webrtc_ice_candidate'):
+        assert msg_type in server.SIGNALING_MESSAGE_TYPES, f"{msg_type} should use the signaling budget"
+    assert 'message' not in server.SIGNALING_MESSAGE_TYPES, "Chat messages should use the general budget"
+    assert server.SIGNALING_MESSAGE_BURST > server.CLIENT_MESSAGE_BURST, \
+        "Signaling burst should exceed the general burst"
+    print("  ✓ Signaling messages are budgeted separately")
+
+    print("\n" + "=" * 60)
+    print("✅ All token bucket tests passed!")
+    return True
+
+
+if __name__ == '__main__':
+    try:
+        success = test_token_bucket()
+        sys.exit(0 if success else 1)
+    except AssertionError as e:
+        print(f"\n❌ FAIL: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
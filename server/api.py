@@ -4,6 +4,7 @@ REST API endpoints for Decentra Chat Server
 Provides HTTP REST API for future desktop application integration
 """
 
+import asyncio
 import json
 import uuid
 import base64
@@ -40,9 +41,9 @@ def sanitize_content_type(content_type):
     return content_type
 
 
-def verify_password(password, password_hash):
-    """Verify a password against its hash."""
-    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+async def verify_password(password, password_hash):
+    """Verify a password against its hash in a worker thread so the event loop isn't blocked."""
+    return await asyncio.to_thread(bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
 
 
 async def api_auth(request):
@@ -77,7 +78,7 @@ async def api_auth(request):
             }, status=400)
         
         user = db.get_user(username)
-        if not user or not verify_password(password, user['password_hash']):
+        if not user or not await verify_password(password, user['password_hash']):
             return web.json_response({
                 'success': False,
                 'error': 'Invalid username or password'
@@ -377,7 +378,7 @@ async def api_upload_attachment(request):
         elif username and password:
             # Password-based authentication
             user = db.get_user(username)
-            if not user or not verify_password(password, user['password_hash']):
+            if not user or not await verify_password(password, user['password_hash']):
                 return web.json_response({
                     'success': False,
                     'error': 'Invalid credentials'
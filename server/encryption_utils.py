@@ -7,13 +7,62 @@ Handles encryption/decryption of sensitive data like SMTP passwords
 from __future__ import annotations
 
 import os
-import sys
 import base64
+import functools
+import hashlib
+import logging
+import struct
+import threading
 from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from typing import Optional
 
+logger = logging.getLogger(__name__)
+
+# Backward-compatibility warnings fire at most once per process, since
+# decrypt() runs for every message row read from the database
+_warned_plaintext = False
+_warned_key_mismatch = False
+
+# Fixed salt for deterministic key derivation
+_KDF_SALT = b'decentra_smtp_salt'
+_KDF_ITERATIONS = 100000
+
+# Leading byte of AES-GCM tokens. Legacy Fernet tokens start with 'g' (the
+# base64 encoding of Fernet's 0x80 version byte), so the two never collide.
+_AESGCM_VERSION = b'\x01'
+_AESGCM_NONCE_SIZE = 12
+# Nonces are a random per-instance prefix followed by a big-endian counter;
+# the prefix is redrawn before the counter can wrap
+_NONCE_PREFIX_SIZE = 8
+_NONCE_COUNTER_MAX = 0xFFFFFFFF
+# Version byte + nonce + 16-byte authentication tag
+_AESGCM_MIN_TOKEN_SIZE = 1 + _AESGCM_NONCE_SIZE + 16
+# Base64 of version + timestamp + IV + one AES block + HMAC (73 bytes)
+_FERNET_MIN_TOKEN_SIZE = 100
+
+
+@functools.lru_cache(maxsize=4)
+def _derive_key(env_key: str, salt: bytes, iters: int) -> bytes:
+    """
+    Derive a raw 32-byte key from a passphrase using PBKDF2-HMAC-SHA256.
+    
+    The derivation is cached so that the expensive KDF only runs once per
+    process for a given passphrase, no matter how many EncryptionManager
+    instances are created.
+    
+    Args:
+        env_key: Passphrase to derive the key from
+        salt: KDF salt
+        iters: Number of PBKDF2 iterations
+        
+    Returns:
+        bytes: Raw 32-byte key
+    """
+    # hashlib calls straight into OpenSSL's PBKDF2 and produces the same
+    # bytes as cryptography's PBKDF2HMAC, so existing data stays readable
+    return hashlib.pbkdf2_hmac('sha256', env_key.encode(), salt, iters, dklen=32)
+
 
 class EncryptionManager:
     """Manages encryption and decryption of sensitive data."""
@@ -22,7 +71,12 @@ class EncryptionManager:
         """Initialize encryption manager with a key from environment or generated."""
         # Get encryption key from environment or generate one
         self.encryption_key = self._get_or_generate_key()
-        self.fernet = Fernet(self.encryption_key)
+        self.aesgcm = AESGCM(self.encryption_key)
+        self._nonce_lock = threading.Lock()
+        self._nonce_prefix = os.urandom(_NONCE_PREFIX_SIZE)
+        self._nonce_counter = 0
+        # Fernet is only kept to read data written before the switch to AES-GCM
+        self.fernet = Fernet(base64.urlsafe_b64encode(self.encryption_key))
     
     def _get_or_generate_key(self) -> bytes:
         """
@@ -32,7 +86,7 @@ class EncryptionManager:
         This environment variable is REQUIRED for the application to start.
         
         Returns:
-            bytes: Fernet encryption key
+            bytes: Raw 32-byte encryption key
             
         Raises:
             RuntimeError: If DECENTRA_ENCRYPTION_KEY is not set
@@ -59,18 +113,61 @@ class EncryptionManager:
                 "\n"
                 "=" * 80 + "\n"
             )
-            print(error_msg, file=sys.stderr)
+            logger.error(error_msg)
             raise RuntimeError("DECENTRA_ENCRYPTION_KEY environment variable is required but not set")
         
-        # Derive a proper Fernet key from the environment variable
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=b'decentra_smtp_salt',  # Fixed salt for deterministic key derivation
-            iterations=100000,
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(env_key.encode()))
-        return key
+        # Derive the encryption key from the environment variable
+        return _derive_key(env_key, _KDF_SALT, _KDF_ITERATIONS)
+    
+    def _next_nonce(self) -> bytes:
+        """
+        Get a unique AES-GCM nonce without a urandom call per encryption.
+        
+        Returns:
+            bytes: 12-byte nonce (random prefix + counter)
+        """
+        with self._nonce_lock:
+            if self._nonce_counter > _NONCE_COUNTER_MAX:
+                self._nonce_prefix = os.urandom(_NONCE_PREFIX_SIZE)
+                self._nonce_counter = 0
+            counter = self._nonce_counter
+            self._nonce_counter += 1
+            return self._nonce_prefix + struct.pack('>I', counter)
+    
+    def encrypt_bytes(self, data: bytes) -> bytes:
+        """
+        Encrypt raw bytes into a binary token.
+        
+        Args:
+            data: Bytes to encrypt
+            
+        Returns:
+            bytes: Token (version byte + nonce + ciphertext), without base64 wrapping
+        """
+        nonce = self._next_nonce()
+        return _AESGCM_VERSION + nonce + self.aesgcm.encrypt(nonce, data, None)
+    
+    def decrypt_bytes(self, token: bytes) -> bytes:
+        """
+        Decrypt a binary token, dispatching on its version byte.
+        
+        Accepts any bytes-like object, so buffers returned by database drivers
+        can be passed in without copying.
+        
+        Args:
+            token: AES-GCM token (version byte + nonce + ciphertext) or legacy Fernet token
+            
+        Returns:
+            bytes: Decrypted plaintext bytes
+            
+        Raises:
+            Exception: If the token cannot be authenticated with the current key
+        """
+        token = memoryview(token)
+        if token[:1] == _AESGCM_VERSION:
+            nonce_end = 1 + _AESGCM_NONCE_SIZE
+            return self.aesgcm.decrypt(token[1:nonce_end], token[nonce_end:], None)
+        return self.fernet.decrypt(token.tobytes())
     
     def encrypt(self, plaintext: str) -> str:
         """
@@ -89,11 +186,11 @@ class EncryptionManager:
             return ''
         
         try:
-            encrypted_bytes = self.fernet.encrypt(plaintext.encode('utf-8'))
-            return base64.urlsafe_b64encode(encrypted_bytes).decode('utf-8')
+            token = self.encrypt_bytes(plaintext.encode('utf-8'))
+            return base64.urlsafe_b64encode(token).decode('ascii')
         except Exception as e:
             error_msg = f"[Encryption] Critical error encrypting data: {e}"
-            print(error_msg)
+            logger.error(error_msg)
             raise RuntimeError(error_msg) from e
     
     def decrypt(self, encrypted: str) -> str:
@@ -109,32 +206,38 @@ class EncryptionManager:
         Returns:
             str: Decrypted plaintext string
         """
+        global _warned_plaintext, _warned_key_mismatch
+        
         if not encrypted:
             return ''
         
-        # First check if this looks like encrypted data
+        # Decode the base64 wrapper once; remember whether it succeeded so the
+        # failure path does not have to decode it again
+        encrypted_bytes = None
         try:
-            encrypted_bytes = base64.urlsafe_b64decode(encrypted.encode('utf-8'))
-            decrypted_bytes = self.fernet.decrypt(encrypted_bytes)
+            encrypted_bytes = base64.urlsafe_b64decode(encrypted.encode('ascii'))
+            decrypted_bytes = self.decrypt_bytes(encrypted_bytes)
             return decrypted_bytes.decode('utf-8')
         except Exception:
-            # If decryption fails, check if it's valid base64 encrypted data
-            # If not, it's likely plaintext (for backward compatibility)
-            try:
-                # Try to verify it's at least valid base64
-                base64.urlsafe_b64decode(encrypted.encode('utf-8'))
-                # If we get here, it's base64 but invalid encryption
-                print(f"[Encryption] Warning: Data appears encrypted but decryption failed. Possible key mismatch.")
-                raise RuntimeError("Failed to decrypt data - encryption key may have changed")
-            except Exception:
-                # Not valid base64, assume it's plaintext (backward compatibility)
-                print(f"[Encryption] Warning: Detected plaintext data. Consider re-encrypting for security.")
-                return encrypted
+            if encrypted_bytes is not None and not _warned_key_mismatch:
+                # Valid base64 but invalid encryption
+                logger.warning("[Encryption] Data appears encrypted but decryption failed. "
+                               "Possible key mismatch. Further occurrences will not be logged.")
+                _warned_key_mismatch = True
+            if not _warned_plaintext:
+                logger.warning("[Encryption] Detected plaintext data. Consider re-encrypting for security. "
+                               "Further occurrences will not be logged.")
+                _warned_plaintext = True
+            # Assume it's plaintext (backward compatibility)
+            return encrypted
     
     def is_encrypted(self, data: str) -> bool:
         """
         Check if data appears to be encrypted.
         
+        This is a structural check on the token's version byte and length; it
+        does not verify authenticity. Use decrypt() when that matters.
+        
         Args:
             data: String to check
             
@@ -145,12 +248,14 @@ class EncryptionManager:
             return False
         
         try:
-            # Try to decode as base64 and decrypt
-            encrypted_bytes = base64.urlsafe_b64decode(data.encode('utf-8'))
-            self.fernet.decrypt(encrypted_bytes)
-            return True
+            encrypted_bytes = base64.urlsafe_b64decode(data.encode('ascii'))
         except Exception:
             return False
+        
+        if encrypted_bytes[:1] == _AESGCM_VERSION:
+            return len(encrypted_bytes) >= _AESGCM_MIN_TOKEN_SIZE
+        # Legacy Fernet tokens are base64 text whose 0x80 version byte encodes to 'g'
+        return encrypted_bytes[:1] == b'g' and len(encrypted_bytes) >= _FERNET_MIN_TOKEN_SIZE
 
 
 # Global encryption manager instance
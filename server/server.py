@@ -5,15 +5,17 @@ A simple WebSocket-based chat server for decentralized communication.
 """
 
 import asyncio
-import json
+import functools
+import orjson
 import websockets
 from datetime import datetime, timedelta, timezone
 import bcrypt
 import secrets
 import string
 import random
+import time
 import re
-from aiohttp import web
+from aiohttp import web, WSCloseCode
 import os
 import base64
 import hashlib
@@ -21,15 +23,66 @@ import jwt
 import pyotp
 import qrcode
 import io
-import traceback
+import logging
+import logging.handlers
+import queue
+from collections import deque
+from dataclasses import dataclass
+try:
+    import uvloop
+except ImportError:
+    # uvloop is not available on Windows; fall back to the default asyncio event loop
+    uvloop = None
 from database import Database
 from api import setup_api_routes
 from email_utils import EmailSender
 from ssl_utils import generate_self_signed_cert, create_ssl_context
 
+# Server activity log. Records are handed to a queue and written to stderr by a
+# background listener thread, so logging never blocks the event loop on I/O.
+logger = logging.getLogger('decentra')
+logger.setLevel(logging.INFO)
+
+
+def setup_logging():
+    """Attach the queue-based handler to the server logger.
+
+    Returns:
+        The started QueueListener; call stop() on it to flush pending records.
+    """
+    log_queue = queue.Queue(-1)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter('[%(asctime)s] %(message)s', datefmt='%H:%M:%S'))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.propagate = False
+    listener.start()
+    return listener
+
+
 # Initialize database
 db = Database()
 
+
+def to_json(obj):
+    """Serialize an object to a JSON string for sending as a text frame.
+    
+    Uses orjson, which is several times faster than the stdlib encoder.
+    OPT_NON_STR_KEYS keeps json.dumps' handling of non-string dict keys.
+    """
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+
+
+@functools.lru_cache(maxsize=None)
+def auth_error_frame(message):
+    """Return the serialized auth_error reply for a static message.
+    
+    Every auth error message is a fixed string, so each reply is encoded once
+    and the cached frame is reused for all later failures.
+    """
+    return to_json({'type': 'auth_error', 'message': message})
+
+
 # JWT Configuration
 # Generate or load a secure secret key for JWT tokens.
 # In production, JWT_SECRET_KEY should be provided via environment variable or a secrets manager.
@@ -73,12 +126,28 @@ JWT_SECRET_KEY = _load_jwt_secret_key()
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_HOURS = 24  # Token expires after 24 hours
 
+# bcrypt cost factor (2^12 key-setup rounds) for new password hashes
+BCRYPT_ROUNDS = 12
+
+# Invite codes are INVITE_CODE_LENGTH characters drawn from A-Z and 0-9
+INVITE_CODE_ALPHABET = (string.ascii_uppercase + string.digits).encode('ascii')
+INVITE_CODE_LENGTH = 8
+
 # Store pending signups temporarily (in-memory)
-# Format: {username: {password_hash, email, invite_code, inviter_username}}
+# Format: {username: PendingSignup}
 # NOTE: This is an in-memory store and will be cleared on server restart.
 # For production environments with multiple server instances, consider using Redis or a database table.
 pending_signups = {}
 
+
+@dataclass(slots=True)
+class PendingSignup:
+    """Signup data held while waiting for the email verification code."""
+    password_hash: str
+    email: str
+    invite_code: str
+    inviter_username: str | None
+
 # Rate limiting for password reset requests (in-memory)
 # Format: {identifier: [timestamp1, timestamp2, ...]}
 # NOTE: This is an in-memory store and will be cleared on server restart.
@@ -88,11 +157,30 @@ PASSWORD_RESET_MAX_ATTEMPTS = 3  # Maximum attempts per time window
 PASSWORD_RESET_TIME_WINDOW = 3600  # Time window in seconds (1 hour)
 
 # Store connected clients: {websocket: username}
+# A dict gives O(1) register/unregister and carries each connection's username,
+# which broadcast_to_server() and send_to_user() match recipients on.
 clients = {}
 # Store message history (deprecated - now per server/channel)
-messages = []
+# Messages are kept in their encoded JSON form, exactly as they were broadcast
 MAX_HISTORY = 100
+messages = deque(maxlen=MAX_HISTORY)
+# Encoded 'history' frame for the current contents of messages; None until rebuilt after a change
+history_frame = None
 MAX_AVATAR_SIZE = 2 * 1024 * 1024  # 2MB
+# Broadcasts to more clients than this are sent in batches, yielding to the event loop in between
+BROADCAST_BATCH_SIZE = 64
+# Frames received before authentication are only small auth requests, so larger ones close the connection unparsed
+MAX_AUTH_FRAME_SIZE = 64 * 1024  # 64KB
+# Per-connection inbound message rate limit (token bucket)
+CLIENT_MESSAGE_RATE = 20  # Messages per second
+CLIENT_MESSAGE_BURST = 60
+# WebRTC signaling has its own, larger budget: joining a voice channel sends an
+# offer and a burst of ICE candidates to every peer at once
+SIGNALING_MESSAGE_TYPES = frozenset({'webrtc_offer', 'webrtc_answer', 'webrtc_ice_candidate'})
+SIGNALING_MESSAGE_RATE = 100  # Messages per second
+SIGNALING_MESSAGE_BURST = 500
+# Reply to messages dropped by the rate limit, serialized once
+RATE_LIMITED_FRAME = to_json({'type': 'error', 'message': 'You are sending messages too quickly. Please slow down.'})
 
 # Periodic cleanup intervals (in seconds)
 CLEANUP_INTERVAL_HOURLY = 3600  # 1 hour
@@ -113,9 +201,13 @@ dm_counter = 0
 role_counter = 0
 
 
-def hash_password(password):
-    """Hash a password using bcrypt."""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+# bcrypt's compiled core releases the GIL while hashing, so concurrent hashes
+# dispatched to worker threads run in parallel across CPU cores
+async def hash_password(password):
+    """Hash a password using bcrypt in a worker thread so the event loop isn't blocked."""
+    password_hash = await asyncio.to_thread(bcrypt.hashpw, password.encode('utf-8'),
+                                            bcrypt.gensalt(rounds=BCRYPT_ROUNDS))
+    return password_hash.decode('utf-8')
 
 
 def serialize_role(role):
@@ -128,9 +220,9 @@ def serialize_role(role):
     return serialized
 
 
-def verify_password(password, password_hash):
-    """Verify a password against its hash."""
-    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+async def verify_password(password, password_hash):
+    """Verify a password against its hash in a worker thread so the event loop isn't blocked."""
+    return await asyncio.to_thread(bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
 
 
 def generate_2fa_secret():
@@ -198,15 +290,14 @@ def log_admin_check(username, first_user, is_admin, context=""):
         is_admin: Boolean result of admin check
         context: Optional context string (e.g., "init message" or "check_admin")
     """
-    prefix = f"[{datetime.now().strftime('%H:%M:%S')}]"
     context_str = f" ({context})" if context else ""
-    print(f"{prefix} Admin check for {username}{context_str}: first_user={first_user}, is_admin={is_admin}")
+    logger.info("Admin check for %s%s: first_user=%s, is_admin=%s", username, context_str, first_user, is_admin)
     
     # Log detailed type and value information for debugging
     username_type = type(username).__name__
     first_user_type = type(first_user).__name__ if first_user else 'NoneType'
-    print(f"{prefix} Debug{context_str}: username='{username}' (type: {username_type}), "
-          f"first_user='{first_user}' (type: {first_user_type})")
+    logger.info("Debug%s: username='%s' (type: %s), first_user='%s' (type: %s)",
+                context_str, username, username_type, first_user, first_user_type)
 
 
 
@@ -266,8 +357,13 @@ def is_valid_email(email):
 
 def generate_invite_code():
     """Generate a random invite code."""
-    alphabet = string.ascii_uppercase + string.digits
-    return ''.join(secrets.choice(alphabet) for _ in range(8))
+    code = bytearray()
+    while len(code) < INVITE_CODE_LENGTH:
+        # One CSPRNG read per attempt; bytes >= 252 are rejected so that
+        # b % 36 stays uniform (252 is the largest multiple of 36 below 256)
+        code.extend(INVITE_CODE_ALPHABET[b % len(INVITE_CODE_ALPHABET)]
+                    for b in secrets.token_bytes(INVITE_CODE_LENGTH + 4) if b < 252)
+    return code[:INVITE_CODE_LENGTH].decode('ascii')
 
 
 def get_next_server_id():
@@ -298,6 +394,25 @@ def get_next_dm_id():
     return f"dm_{dm_counter}"
 
 
+# Second-resolution cache for utc_timestamp()
+_timestamp_second = None
+_timestamp_iso = ''
+
+
+def utc_timestamp():
+    """Return the current UTC time as an ISO 8601 string.
+    
+    Live messages only need second resolution, so the string is formatted at
+    most once per second and shared by every message sent within it.
+    """
+    global _timestamp_second, _timestamp_iso
+    now = int(time.time())
+    if now != _timestamp_second:
+        _timestamp_second = now
+        _timestamp_iso = datetime.fromtimestamp(now, timezone.utc).isoformat()
+    return _timestamp_iso
+
+
 def create_message_object(username, msg_content, context, context_id, user_profile, message_key=None, message_id=None):
     """
     Create a message object with common fields.
@@ -318,7 +433,7 @@ def create_message_object(username, msg_content, context, context_id, user_profi
         'type': 'message',
         'username': username,
         'content': msg_content,
-        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'timestamp': utc_timestamp(),
         'context': context,
         'context_id': context_id,
         'avatar': user_profile.get('avatar', '👤') if user_profile else '👤',
@@ -340,6 +455,35 @@ def create_message_object(username, msg_content, context, context_id, user_profi
     return msg_obj
 
 
+def add_to_history(msg_json):
+    """Append an encoded message to the global history and invalidate the cached history frame."""
+    global history_frame
+    messages.append(msg_json)
+    history_frame = None
+
+
+def get_history_frame():
+    """Return the encoded 'history' frame, rebuilding it only if messages changed since the last call.
+    
+    Every client joining between two global messages is sent the same string,
+    so a burst of reconnects costs a single join over the history.
+    """
+    global history_frame
+    if history_frame is None:
+        # Splice the already-encoded messages into the envelope instead of re-encoding them
+        history_frame = '{"type":"history","messages":[' + ','.join(messages) + ']}'
+    return history_frame
+
+
+def system_message(content):
+    """Build an encoded system notice, ready to be broadcast as-is to every recipient."""
+    return to_json({
+        'type': 'system',
+        'content': content,
+        'timestamp': utc_timestamp()
+    })
+
+
 def init_counters_from_db():
     """Initialize ID counters from database."""
     global server_counter, channel_counter, dm_counter, role_counter
@@ -569,28 +713,46 @@ def get_default_permissions():
     }
 
 
+async def send_to_clients(targets, message):
+    """Send a pre-serialized message to a snapshot of client websockets concurrently.
+    
+    Clients whose send fails are removed from `clients` so later broadcasts
+    don't keep retrying dead sockets. Large fan-outs are split into batches of
+    BROADCAST_BATCH_SIZE so a big room can't stall the event loop.
+    
+    Args:
+        targets: List of client websockets to send to
+        message: The serialized message to send
+    """
+    for start in range(0, len(targets), BROADCAST_BATCH_SIZE):
+        if start:
+            # Let other connections' reads and writes run between batches
+            await asyncio.sleep(0)
+        batch = targets[start:start + BROADCAST_BATCH_SIZE]
+        results = await asyncio.gather(*(client_ws.send_str(message) for client_ws in batch),
+                                       return_exceptions=True)
+        for client_ws, result in zip(batch, results):
+            if isinstance(result, Exception):
+                clients.pop(client_ws, None)
+
+
 async def broadcast(message, exclude=None):
-    """Broadcast a message to all connected clients except the excluded one."""
-    if clients:
-        tasks = []
-        for client_ws, client_username in clients.items():
-            if client_ws != exclude:
-                tasks.append(client_ws.send_str(message))
-        if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
+    """Broadcast a pre-serialized message to all connected clients except the excluded one."""
+    # Copy the keys in C and drop the excluded client once, instead of testing every client
+    targets = list(clients)
+    if exclude in clients:
+        targets.remove(exclude)
+    await send_to_clients(targets, message)
 
 
 async def broadcast_to_server(server_id, message, exclude=None):
-    """Broadcast a message to all members of a server."""
+    """Broadcast a pre-serialized message to all members of a server."""
     server_members_data = db.get_server_members(server_id)
     server_members = {m['username'] for m in server_members_data}
     
-    tasks = []
-    for client_ws, client_username in clients.items():
-        if client_username in server_members and client_ws != exclude:
-            tasks.append(client_ws.send_str(message))
-    if tasks:
-        await asyncio.gather(*tasks, return_exceptions=True)
+    targets = [client_ws for client_ws, client_username in clients.items()
+               if client_username in server_members and client_ws is not exclude]
+    await send_to_clients(targets, message)
 
 
 
@@ -639,7 +801,7 @@ async def cleanup_voice_state(username, reason=''):
     
     # Notify if in direct call
     if old_state.get('direct_call_peer'):
-        await send_to_user(old_state['direct_call_peer'], json.dumps({
+        await send_to_user(old_state['direct_call_peer'], to_json({
             'type': 'direct_call_ended',
             'from': username,
             'reason': reason or 'ended'
@@ -688,10 +850,479 @@ def create_voice_state(direct_call_peer=None, server_id=None, channel_id=None):
     return state
 
 
+class TokenBucket:
+    """Token bucket rate limiter for a single connection's inbound messages."""
+    
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.last_refill = time.monotonic()
+    
+    def consume(self):
+        """Take one token, returning False if the bucket is empty."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+async def handle_signup(websocket, auth_data):
+    """Handle a signup request, creating the account or starting email verification."""
+    username = auth_data.get('username', '').strip()
+    password = auth_data.get('password', '')
+    email = auth_data.get('email', '').strip()
+    invite_code = auth_data.get('invite_code', '').strip()
+    
+    # Get admin settings
+    admin_settings = db.get_admin_settings()
+    allow_registration = admin_settings.get('allow_registration', True)
+    require_invite = admin_settings.get('require_invite', False)
+    require_email_verification = admin_settings.get('require_email_verification', False)
+    
+    # Check if registration is disabled
+    if not allow_registration:
+        await websocket.send_str(auth_error_frame('Registration is currently disabled'))
+        return None
+    
+    # Validation
+    if not username or not password or not email:
+        await websocket.send_str(auth_error_frame('Username, password, and email are required'))
+        return None
+    
+    # Email validation
+    if not is_valid_email(email):
+        await websocket.send_str(auth_error_frame('Invalid email address format'))
+        return None
+    
+    if db.get_user(username):
+        await websocket.send_str(auth_error_frame('Username already exists'))
+        return None
+    
+    # Check if email is already registered
+    if db.get_user_by_email(email):
+        await websocket.send_str(auth_error_frame('Email address already registered'))
+        return None
+    
+    # Check invite code requirement
+    invite_data = db.get_invite_code(invite_code) if invite_code else None
+    
+    # Require invite if admin setting is enabled OR if users already exist (legacy behavior)
+    if not invite_data and (require_invite or db.has_users()):
+        await websocket.send_str(auth_error_frame('Valid invite code required'))
+        return None
+    
+    # Determine if email verification should be used
+    email_sender = EmailSender(admin_settings)
+    should_verify_email = require_email_verification and email_sender.is_configured()
+    
+    if should_verify_email:
+        # Email verification is enabled and SMTP is configured
+        # Generate verification code (6-digit number)
+        verification_code = ''.join(secrets.choice(string.digits) for _ in range(6))
+        
+        # Store verification code with 15 minute expiration
+        expires_at = datetime.now(timezone.utc) + timedelta(minutes=15)
+        if not db.create_email_verification_code(email, username, verification_code, expires_at):
+            await websocket.send_str(auth_error_frame('Failed to generate verification code'))
+            return None
+        
+        # Send verification email
+        if not email_sender.send_verification_email(email, username, verification_code):
+            await websocket.send_str(auth_error_frame('Failed to send verification email. Please check SMTP settings.'))
+            db.delete_email_verification_code(email, username)
+            return None
+        
+        # Hash before the race check below so that nothing is awaited between
+        # checking for an existing pending signup and storing this one
+        password_hash = await hash_password(password)
+        
+        # Check for race condition - prevent overwriting existing pending signup
+        if username in pending_signups:
+            await websocket.send_str(auth_error_frame('A signup is already in progress for this username. Please wait or use a different username.'))
+            db.delete_email_verification_code(email, username)
+            return None
+        
+        # Store signup data temporarily for verification step
+        inviter_username = invite_data['creator'] if invite_data else None
+        pending_signups[username] = PendingSignup(
+            password_hash=password_hash,
+            email=email,
+            invite_code=invite_code,
+            inviter_username=inviter_username
+        )
+        
+        await websocket.send_str(to_json({
+            'type': 'verification_required',
+            'message': 'Verification code sent to your email'
+        }))
+        return None
+    else:
+        # Email verification is disabled or SMTP not configured - create account immediately
+        password_hash = await hash_password(password)
+        
+        # Claim the invite atomically so a single-use code can't be redeemed by
+        # two concurrent signups
+        if invite_data:
+            invite_data = db.consume_invite_code(invite_code)
+            if not invite_data:
+                await websocket.send_str(auth_error_frame('Valid invite code required'))
+                return None
+        
+        # Create user account in database (email not verified)
+        if not db.create_user(username, password_hash, email, email_verified=False):
+            if invite_data:
+                # Give the invite back so the signup can be retried
+                db.create_invite_code(invite_code, invite_data['creator'],
+                                      invite_data.get('code_type', 'global'), invite_data.get('server_id'))
+            await websocket.send_str(auth_error_frame('Failed to create account'))
+            return None
+        
+        # Auto-friend inviter if signing up with invite code
+        inviter_username = invite_data['creator'] if invite_data else None
+        if inviter_username:
+            # Add mutual friendship
+            db.add_friend_request(inviter_username, username)
+            db.accept_friend_request(inviter_username, username)
+            # Log invite usage (the code was already removed when it was claimed)
+            db.log_invite_usage(invite_code, username, invite_data.get('server_id'))
+        
+        # Generate JWT token for the user
+        token = generate_jwt_token(username)
+        
+        await websocket.send_str(to_json({
+            'type': 'auth_success',
+            'message': 'Account created successfully',
+            'token': token
+        }))
+        logger.info("New user registered: %s", username)
+        
+        # Notify inviter that they are now friends
+        if inviter_username:
+            new_user_avatar = get_avatar_data(username)
+            await send_to_user(inviter_username, to_json({
+                'type': 'friend_added',
+                'username': username,
+                **new_user_avatar
+            }))
+        
+        return username
+
+
+async def handle_verify_email(websocket, auth_data):
+    """Handle an email verification code for a pending signup."""
+    username = auth_data.get('username', '').strip()
+    code = auth_data.get('code', '').strip()
+    
+    # Validate verification code format (must be exactly 6 digits)
+    if not code or not code.isdigit() or len(code) != 6:
+        await websocket.send_str(auth_error_frame('Invalid verification code format'))
+        return None
+    
+    # Check if we have pending signup data
+    if username not in pending_signups:
+        await websocket.send_str(auth_error_frame('No pending signup found. Please start signup again.'))
+        return None
+    
+    pending = pending_signups[username]
+    email = pending.email
+    
+    # Verify the code
+    verification_data = db.get_email_verification_code(email, username)
+    if not verification_data or verification_data['code'] != code:
+        await websocket.send_str(auth_error_frame('Invalid or expired verification code'))
+        return None
+    
+    # Create user account in database
+    if not db.create_user(username, pending.password_hash, email, email_verified=True):
+        # Clean up so the user can restart signup if account creation fails
+        db.delete_email_verification_code(email, username)
+        if username in pending_signups:
+            del pending_signups[username]
+        await websocket.send_str(auth_error_frame('Failed to create account. Please restart signup.'))
+        return None
+    
+    # Clean up verification code and pending signup
+    db.delete_email_verification_code(email, username)
+    del pending_signups[username]
+    
+    # Auto-friend inviter if signing up with invite code
+    inviter_username = pending.inviter_username
+    if inviter_username:
+        # Add mutual friendship
+        db.add_friend_request(inviter_username, username)
+        db.accept_friend_request(inviter_username, username)
+        # Log invite usage and remove used invite code
+        if pending.invite_code:
+            invite_data = db.consume_invite_code(pending.invite_code)
+            if invite_data:
+                db.log_invite_usage(pending.invite_code, username, invite_data.get('server_id'))
+    
+    # Generate JWT token for the user
+    token = generate_jwt_token(username)
+    
+    await websocket.send_str(to_json({
+        'type': 'auth_success',
+        'message': 'Account created successfully',
+        'token': token
+    }))
+    logger.info("New user registered: %s", username)
+    
+    # Notify inviter that they are now friends
+    if inviter_username:
+        new_user_avatar = get_avatar_data(username)
+        await send_to_user(inviter_username, to_json({
+            'type': 'friend_added',
+            'username': username,
+            **new_user_avatar
+        }))
+    
+    return username
+
+
+async def handle_login(websocket, auth_data):
+    """Handle a username/password login, including the 2FA check."""
+    username = auth_data.get('username', '').strip()
+    password = auth_data.get('password', '')
+    totp_code = auth_data.get('totp_code', '').strip()  # Optional 2FA code
+    
+    if not username or not password:
+        await websocket.send_str(auth_error_frame('Username and password are required'))
+        return None
+    
+    user = db.get_user(username)
+    if not user:
+        await websocket.send_str(auth_error_frame('Invalid username or password'))
+        return None
+    
+    if not await verify_password(password, user['password_hash']):
+        await websocket.send_str(auth_error_frame('Invalid username or password'))
+        return None
+    
+    # Check if 2FA is enabled
+    twofa_data = db.get_2fa_secret(username)
+    if twofa_data and twofa_data.get('enabled'):
+        # 2FA is enabled, need to verify code
+        if not totp_code:
+            await websocket.send_str(to_json({
+                'type': '2fa_required',
+                'message': 'Two-factor authentication code required'
+            }))
+            return None
+        
+        # Validate TOTP code format (6 digits) or backup code format (8 alphanumeric)
+        if not (totp_code.isdigit() and len(totp_code) == 6) and not (totp_code.isalnum() and len(totp_code) == 8):
+            await websocket.send_str(auth_error_frame('Invalid two-factor authentication code format'))
+            return None
+        
+        # Verify 2FA token or backup code
+        valid_code = False
+        if totp_code.isdigit() and len(totp_code) == 6:
+            # Try TOTP verification
+            if verify_2fa_token(twofa_data['secret'], totp_code):
+                valid_code = True
+        
+        if not valid_code and totp_code.isalnum() and len(totp_code) == 8:
+            # Try backup code
+            if db.use_backup_code(username, totp_code):
+                valid_code = True
+                logger.info("User %s used backup code for 2FA", username)
+        
+        if not valid_code:
+            await websocket.send_str(auth_error_frame('Invalid two-factor authentication code'))
+            return None
+    
+    # Generate JWT token for the user
+    token = generate_jwt_token(username)
+    
+    await websocket.send_str(to_json({
+        'type': 'auth_success',
+        'message': 'Login successful',
+        'token': token
+    }))
+    logger.info("User logged in: %s", username)
+    return username
+
+
+async def handle_token(websocket, auth_data):
+    """Handle authentication with a previously issued JWT."""
+    token = auth_data.get('token', '')
+    
+    if not token:
+        await websocket.send_str(auth_error_frame('Token is required'))
+        return None
+    
+    # Verify the token and extract username
+    username = verify_jwt_token(token)
+    if not username:
+        await websocket.send_str(auth_error_frame('Invalid or expired token'))
+        return None
+    
+    # Verify user still exists in database
+    user = db.get_user(username)
+    if not user:
+        await websocket.send_str(auth_error_frame('User not found'))
+        return None
+    
+    # Generate a new JWT token to refresh the session
+    new_token = generate_jwt_token(username)
+    
+    await websocket.send_str(to_json({
+        'type': 'auth_success',
+        'message': 'Token authentication successful',
+        'token': new_token
+    }))
+    logger.info("User authenticated via token: %s", username)
+    return username
+
+
+async def handle_request_password_reset(websocket, auth_data):
+    """Handle a request for a password reset email."""
+    identifier = auth_data.get('identifier', '').strip()  # Can be username or email
+    
+    if not identifier:
+        await websocket.send_str(auth_error_frame('Username or email is required'))
+        return None
+    
+    # Check rate limiting to prevent abuse
+    if not check_password_reset_rate_limit(identifier):
+        await websocket.send_str(auth_error_frame('Too many password reset requests. Please try again later.'))
+        logger.info("Rate limit exceeded for password reset: %s", identifier)
+        return None
+    
+    # Try to find user by username or email
+    user = db.get_user(identifier)
+    if not user:
+        user = db.get_user_by_email(identifier)
+    
+    # Always return success to prevent username/email enumeration
+    if user and user.get('email'):
+        # Generate reset token
+        reset_token = secrets.token_urlsafe(32)
+        expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+        
+        # Save token to database
+        if db.create_password_reset_token(user['username'], reset_token, expires_at):
+            # Send password reset email
+            email_sender = EmailSender(db.get_admin_settings())
+            if email_sender.send_password_reset_email(
+                user['email'], 
+                user['username'], 
+                reset_token
+            ):
+                logger.info("Password reset email sent to %s", user['username'])
+    
+    # Always return success to prevent enumeration attacks
+    await websocket.send_str(to_json({
+        'type': 'password_reset_requested',
+        'message': 'If an account exists with that email, a password reset link has been sent.'
+    }))
+
+
+async def handle_validate_reset_token(websocket, auth_data):
+    """Handle validation of a password reset link before the new password is entered."""
+    token = auth_data.get('token', '').strip()
+    
+    if not token:
+        await websocket.send_str(auth_error_frame('Reset token is required'))
+        return None
+    
+    # Get token from database
+    token_data = db.get_password_reset_token(token)
+    
+    if not token_data:
+        await websocket.send_str(auth_error_frame('Invalid or expired reset token'))
+        return None
+    
+    # Check if token is expired or used
+    if token_data.get('used'):
+        await websocket.send_str(auth_error_frame('This reset link has already been used'))
+        return None
+    
+    expires_at = datetime.fromisoformat(token_data['expires_at'])
+    if datetime.now(timezone.utc) > expires_at:
+        await websocket.send_str(auth_error_frame('This reset link has expired'))
+        return None
+    
+    # Token is valid
+    await websocket.send_str(to_json({
+        'type': 'reset_token_valid',
+        'username': token_data['username']
+    }))
+
+
+async def handle_reset_password(websocket, auth_data):
+    """Handle completion of a password reset."""
+    token = auth_data.get('token', '').strip()
+    new_password = auth_data.get('new_password', '')
+    
+    if not token or not new_password:
+        await websocket.send_str(auth_error_frame('Token and new password are required'))
+        return None
+    
+    # Validate password strength
+    if (
+        len(new_password) < 8
+        or not re.search(r"[a-z]", new_password)
+        or not re.search(r"[A-Z]", new_password)
+        or not re.search(r"[0-9]", new_password)
+        or not re.search(r"[^A-Za-z0-9]", new_password)
+    ):
+        await websocket.send_str(auth_error_frame('Password must be at least 8 characters and include lowercase, uppercase, number, and special character'))
+        return None
+    
+    # Get and validate token
+    token_data = db.get_password_reset_token(token)
+    
+    if not token_data or token_data.get('used'):
+        await websocket.send_str(auth_error_frame('Invalid or expired reset token'))
+        return None
+    
+    expires_at = datetime.fromisoformat(token_data['expires_at'])
+    if datetime.now(timezone.utc) > expires_at:
+        await websocket.send_str(auth_error_frame('This reset link has expired'))
+        return None
+    
+    # Mark the token used before hashing so that two concurrent requests
+    # can't both redeem it while the hash is being computed
+    if not db.mark_reset_token_used(token):
+        await websocket.send_str(auth_error_frame('Invalid or expired reset token'))
+        return None
+    
+    # Update password
+    password_hash = await hash_password(new_password)
+    if db.update_user_password(token_data['username'], password_hash):
+        await websocket.send_str(to_json({
+            'type': 'password_reset_success',
+            'message': 'Password has been reset successfully'
+        }))
+        logger.info("Password reset for user: %s", token_data['username'])
+    else:
+        await websocket.send_str(auth_error_frame('Failed to reset password'))
+
+
+# Auth request handlers by message type. Each returns the username once the
+# client is authenticated, or None after replying to the client.
+AUTH_HANDLERS = {
+    'signup': handle_signup,
+    'verify_email': handle_verify_email,
+    'login': handle_login,
+    'token': handle_token,
+    'request_password_reset': handle_request_password_reset,
+    'validate_reset_token': handle_validate_reset_token,
+    'reset_password': handle_reset_password,
+}
+
+
 async def handler(websocket):
     """Handle client connections."""
     username = None
     authenticated = False
+    bucket = TokenBucket(CLIENT_MESSAGE_RATE, CLIENT_MESSAGE_BURST)
+    signaling_bucket = TokenBucket(SIGNALING_MESSAGE_RATE, SIGNALING_MESSAGE_BURST)
     
     try:
         # Register client
@@ -701,529 +1332,32 @@ async def handler(websocket):
         while not authenticated:
             msg = await websocket.receive()
             if msg.type == web.WSMsgType.TEXT:
-                auth_data = json.loads(msg.data)
+                if len(msg.data) > MAX_AUTH_FRAME_SIZE:
+                    await websocket.close(code=WSCloseCode.POLICY_VIOLATION, message=b'Authentication request too large')
+                    break
+                if not bucket.consume():
+                    await websocket.send_str(auth_error_frame('Too many requests. Please slow down.'))
+                    continue
+                auth_data = orjson.loads(msg.data)
             elif msg.type == web.WSMsgType.ERROR:
-                print(f'WebSocket connection closed with exception {websocket.exception()}')
+                logger.error("WebSocket connection closed with exception %s", websocket.exception())
                 break
             else:
                 break
             
-            # Handle signup
-            if auth_data.get('type') == 'signup':
-                username = auth_data.get('username', '').strip()
-                password = auth_data.get('password', '')
-                email = auth_data.get('email', '').strip()
-                invite_code = auth_data.get('invite_code', '').strip()
-                
-                # Get admin settings
-                admin_settings = db.get_admin_settings()
-                allow_registration = admin_settings.get('allow_registration', True)
-                require_invite = admin_settings.get('require_invite', False)
-                require_email_verification = admin_settings.get('require_email_verification', False)
-                
-                # Check if registration is disabled
-                if not allow_registration:
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'Registration is currently disabled'
-                    }))
-                    continue
-                
-                # Validation
-                if not username or not password or not email:
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'Username, password, and email are required'
-                    }))
-                    continue
-                
-                # Email validation
-                if not is_valid_email(email):
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'Invalid email address format'
-                    }))
-                    continue
-                
-                if db.get_user(username):
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'Username already exists'
-                    }))
-                    continue
-                
-                # Check if email is already registered
-                if db.get_user_by_email(email):
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'Email address already registered'
-                    }))
-                    continue
-                
-                # Check invite code requirement
-                all_users = db.get_all_users()
-                invite_data = db.get_invite_code(invite_code) if invite_code else None
-                
-                # Require invite if admin setting is enabled OR if users already exist (legacy behavior)
-                if (require_invite or all_users) and not invite_data:
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'Valid invite code required'
-                    }))
-                    continue
-                
-                # Determine if email verification should be used
-                email_sender = EmailSender(admin_settings)
-                should_verify_email = require_email_verification and email_sender.is_configured()
-                
-                if should_verify_email:
-                    # Email verification is enabled and SMTP is configured
-                    # Generate verification code (6-digit number)
-                    verification_code = ''.join(secrets.choice(string.digits) for _ in range(6))
-                    
-                    # Store verification code with 15 minute expiration
-                    expires_at = datetime.now(timezone.utc) + timedelta(minutes=15)
-                    if not db.create_email_verification_code(email, username, verification_code, expires_at):
-                        await websocket.send_str(json.dumps({
-                            'type': 'auth_error',
-                            'message': 'Failed to generate verification code'
-                        }))
-                        continue
-                    
-                    # Send verification email
-                    if not email_sender.send_verification_email(email, username, verification_code):
-                        await websocket.send_str(json.dumps({
-                            'type': 'auth_error',
-                            'message': 'Failed to send verification email. Please check SMTP settings.'
-                        }))
-                        db.delete_email_verification_code(email, username)
-                        continue
-                    
-                    # Check for race condition - prevent overwriting existing pending signup
-                    if username in pending_signups:
-                        await websocket.send_str(json.dumps({
-                            'type': 'auth_error',
-                            'message': 'A signup is already in progress for this username. Please wait or use a different username.'
-                        }))
-                        db.delete_email_verification_code(email, username)
-                        continue
-                    
-                    # Store signup data temporarily for verification step
-                    inviter_username = invite_data['creator'] if invite_data else None
-                    pending_signups[username] = {
-                        'password_hash': hash_password(password),
-                        'email': email,
-                        'invite_code': invite_code,
-                        'inviter_username': inviter_username
-                    }
-                    
-                    await websocket.send_str(json.dumps({
-                        'type': 'verification_required',
-                        'message': 'Verification code sent to your email'
-                    }))
-                    continue
-                else:
-                    # Email verification is disabled or SMTP not configured - create account immediately
-                    # Create user account in database (email not verified)
-                    if not db.create_user(username, hash_password(password), email, email_verified=False):
-                        await websocket.send_str(json.dumps({
-                            'type': 'auth_error',
-                            'message': 'Failed to create account'
-                        }))
-                        continue
-                    
-                    # Auto-friend inviter if signing up with invite code
-                    inviter_username = invite_data['creator'] if invite_data else None
-                    if inviter_username:
-                        # Add mutual friendship
-                        db.add_friend_request(inviter_username, username)
-                        db.accept_friend_request(inviter_username, username)
-                        # Log invite usage and remove used invite code
-                        if invite_code:
-                            db.log_invite_usage(invite_code, username, invite_data.get('server_id'))
-                            db.delete_invite_code(invite_code)
-                    
-                    # Generate JWT token for the user
-                    token = generate_jwt_token(username)
-                    
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_success',
-                        'message': 'Account created successfully',
-                        'token': token
-                    }))
-                    authenticated = True
-                    clients[websocket] = username
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] New user registered: {username}")
-                    
-                    # Notify inviter that they are now friends
-                    if inviter_username:
-                        new_user_avatar = get_avatar_data(username)
-                        await send_to_user(inviter_username, json.dumps({
-                            'type': 'friend_added',
-                            'username': username,
-                            **new_user_avatar
-                        }))
+            auth_handler = AUTH_HANDLERS.get(auth_data.get('type'))
+            if auth_handler is None:
+                await websocket.send_str(auth_error_frame('Invalid authentication request'))
+                continue
             
-            # Handle email verification
-            elif auth_data.get('type') == 'verify_email':
-                username = auth_data.get('username', '').strip()
-                code = auth_data.get('code', '').strip()
-                
-                # Validate verification code format (must be exactly 6 digits)
-                if not code or not code.isdigit() or len(code) != 6:
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'Invalid verification code format'
-                    }))
-                    continue
-                
-                # Check if we have pending signup data
-                if username not in pending_signups:
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'No pending signup found. Please start signup again.'
-                    }))
-                    continue
-                
-                pending = pending_signups[username]
-                email = pending['email']
-                
-                # Verify the code
-                verification_data = db.get_email_verification_code(email, username)
-                if not verification_data or verification_data['code'] != code:
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'Invalid or expired verification code'
-                    }))
-                    continue
-                
-                # Create user account in database
-                if not db.create_user(username, pending['password_hash'], email, email_verified=True):
-                    # Clean up so the user can restart signup if account creation fails
-                    db.delete_email_verification_code(email, username)
-                    if username in pending_signups:
-                        del pending_signups[username]
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'Failed to create account. Please restart signup.'
-                    }))
-                    continue
-                
-                # Clean up verification code and pending signup
-                db.delete_email_verification_code(email, username)
-                del pending_signups[username]
-                
-                # Auto-friend inviter if signing up with invite code
-                inviter_username = pending['inviter_username']
-                if inviter_username:
-                    # Add mutual friendship
-                    db.add_friend_request(inviter_username, username)
-                    db.accept_friend_request(inviter_username, username)
-                    # Log invite usage and remove used invite code
-                    if pending['invite_code']:
-                        invite_data = db.get_invite_code(pending['invite_code'])
-                        if invite_data:
-                            db.log_invite_usage(pending['invite_code'], username, invite_data.get('server_id'))
-                        db.delete_invite_code(pending['invite_code'])
-                
-                # Generate JWT token for the user
-                token = generate_jwt_token(username)
-                
-                await websocket.send_str(json.dumps({
-                    'type': 'auth_success',
-                    'message': 'Account created successfully',
-                    'token': token
-                }))
+            username = await auth_handler(websocket, auth_data)
+            if username:
                 authenticated = True
                 clients[websocket] = username
-                print(f"[{datetime.now().strftime('%H:%M:%S')}] New user registered: {username}")
-                
-                # Notify inviter that they are now friends
-                if inviter_username:
-                    new_user_avatar = get_avatar_data(username)
-                    await send_to_user(inviter_username, json.dumps({
-                        'type': 'friend_added',
-                        'username': username,
-                        **new_user_avatar
-                    }))
-            
-            # Handle login
-            elif auth_data.get('type') == 'login':
-                username = auth_data.get('username', '').strip()
-                password = auth_data.get('password', '')
-                totp_code = auth_data.get('totp_code', '').strip()  # Optional 2FA code
-                
-                if not username or not password:
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'Username and password are required'
-                    }))
-                    continue
-                
-                user = db.get_user(username)
-                if not user:
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'Invalid username or password'
-                    }))
-                    continue
-                
-                if not verify_password(password, user['password_hash']):
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'Invalid username or password'
-                    }))
-                    continue
-                
-                # Check if 2FA is enabled
-                twofa_data = db.get_2fa_secret(username)
-                if twofa_data and twofa_data.get('enabled'):
-                    # 2FA is enabled, need to verify code
-                    if not totp_code:
-                        await websocket.send_str(json.dumps({
-                            'type': '2fa_required',
-                            'message': 'Two-factor authentication code required'
-                        }))
-                        continue
-                    
-                    # Validate TOTP code format (6 digits) or backup code format (8 alphanumeric)
-                    if not (totp_code.isdigit() and len(totp_code) == 6) and not (totp_code.isalnum() and len(totp_code) == 8):
-                        await websocket.send_str(json.dumps({
-                            'type': 'auth_error',
-                            'message': 'Invalid two-factor authentication code format'
-                        }))
-                        continue
-                    
-                    # Verify 2FA token or backup code
-                    valid_code = False
-                    if totp_code.isdigit() and len(totp_code) == 6:
-                        # Try TOTP verification
-                        if verify_2fa_token(twofa_data['secret'], totp_code):
-                            valid_code = True
-                    
-                    if not valid_code and totp_code.isalnum() and len(totp_code) == 8:
-                        # Try backup code
-                        if db.use_backup_code(username, totp_code):
-                            valid_code = True
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] User {username} used backup code for 2FA")
-                    
-                    if not valid_code:
-                        await websocket.send_str(json.dumps({
-                            'type': 'auth_error',
-                            'message': 'Invalid two-factor authentication code'
-                        }))
-                        continue
-                
-                # Generate JWT token for the user
-                token = generate_jwt_token(username)
-                
-                await websocket.send_str(json.dumps({
-                    'type': 'auth_success',
-                    'message': 'Login successful',
-                    'token': token
-                }))
-                authenticated = True
-                clients[websocket] = username
-                print(f"[{datetime.now().strftime('%H:%M:%S')}] User logged in: {username}")
-            
-            # Handle token-based authentication
-            elif auth_data.get('type') == 'token':
-                token = auth_data.get('token', '')
-                
-                if not token:
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'Token is required'
-                    }))
-                    continue
-                
-                # Verify the token and extract username
-                username = verify_jwt_token(token)
-                if not username:
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'Invalid or expired token'
-                    }))
-                    continue
-                
-                # Verify user still exists in database
-                user = db.get_user(username)
-                if not user:
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'User not found'
-                    }))
-                    continue
-                
-                # Generate a new JWT token to refresh the session
-                new_token = generate_jwt_token(username)
-                
-                await websocket.send_str(json.dumps({
-                    'type': 'auth_success',
-                    'message': 'Token authentication successful',
-                    'token': new_token
-                }))
-                authenticated = True
-                clients[websocket] = username
-                print(f"[{datetime.now().strftime('%H:%M:%S')}] User authenticated via token: {username}")
-            
-            # Handle password reset request
-            elif auth_data.get('type') == 'request_password_reset':
-                identifier = auth_data.get('identifier', '').strip()  # Can be username or email
-                
-                if not identifier:
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'Username or email is required'
-                    }))
-                    continue
-                
-                # Check rate limiting to prevent abuse
-                if not check_password_reset_rate_limit(identifier):
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'Too many password reset requests. Please try again later.'
-                    }))
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Rate limit exceeded for password reset: {identifier}")
-                    continue
-                
-                # Try to find user by username or email
-                user = db.get_user(identifier)
-                if not user:
-                    user = db.get_user_by_email(identifier)
-                
-                # Always return success to prevent username/email enumeration
-                if user and user.get('email'):
-                    # Generate reset token
-                    reset_token = secrets.token_urlsafe(32)
-                    expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
-                    
-                    # Save token to database
-                    if db.create_password_reset_token(user['username'], reset_token, expires_at):
-                        # Send password reset email
-                        email_sender = EmailSender(db.get_admin_settings())
-                        if email_sender.send_password_reset_email(
-                            user['email'], 
-                            user['username'], 
-                            reset_token
-                        ):
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Password reset email sent to {user['username']}")
-                
-                # Always return success to prevent enumeration attacks
-                await websocket.send_str(json.dumps({
-                    'type': 'password_reset_requested',
-                    'message': 'If an account exists with that email, a password reset link has been sent.'
-                }))
-            
-            # Handle password reset validation
-            elif auth_data.get('type') == 'validate_reset_token':
-                token = auth_data.get('token', '').strip()
-                
-                if not token:
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'Reset token is required'
-                    }))
-                    continue
-                
-                # Get token from database
-                token_data = db.get_password_reset_token(token)
-                
-                if not token_data:
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'Invalid or expired reset token'
-                    }))
-                    continue
-                
-                # Check if token is expired or used
-                if token_data.get('used'):
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'This reset link has already been used'
-                    }))
-                    continue
-                
-                expires_at = datetime.fromisoformat(token_data['expires_at'])
-                if datetime.now(timezone.utc) > expires_at:
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'This reset link has expired'
-                    }))
-                    continue
-                
-                # Token is valid
-                await websocket.send_str(json.dumps({
-                    'type': 'reset_token_valid',
-                    'username': token_data['username']
-                }))
-            
-            # Handle password reset completion
-            elif auth_data.get('type') == 'reset_password':
-                token = auth_data.get('token', '').strip()
-                new_password = auth_data.get('new_password', '')
-                
-                if not token or not new_password:
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'Token and new password are required'
-                    }))
-                    continue
-                
-                # Validate password strength
-                if (
-                    len(new_password) < 8
-                    or not re.search(r"[a-z]", new_password)
-                    or not re.search(r"[A-Z]", new_password)
-                    or not re.search(r"[0-9]", new_password)
-                    or not re.search(r"[^A-Za-z0-9]", new_password)
-                ):
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'Password must be at least 8 characters and include lowercase, uppercase, number, and special character'
-                    }))
-                    continue
-                
-                # Get and validate token
-                token_data = db.get_password_reset_token(token)
-                
-                if not token_data or token_data.get('used'):
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'Invalid or expired reset token'
-                    }))
-                    continue
-                
-                expires_at = datetime.fromisoformat(token_data['expires_at'])
-                if datetime.now(timezone.utc) > expires_at:
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'This reset link has expired'
-                    }))
-                    continue
-                
-                # Update password
-                password_hash = hash_password(new_password)
-                if db.update_user_password(token_data['username'], password_hash):
-                    # Mark token as used
-                    db.mark_reset_token_used(token)
-                    
-                    await websocket.send_str(json.dumps({
-                        'type': 'password_reset_success',
-                        'message': 'Password has been reset successfully'
-                    }))
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Password reset for user: {token_data['username']}")
-                else:
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'Failed to reset password'
-                    }))
-            
-            else:
-                await websocket.send_str(json.dumps({
-                    'type': 'auth_error',
-                    'message': 'Invalid authentication request'
-                }))
+        
+        # The connection closed before authenticating; nothing to send
+        if not authenticated:
+            return
         
         # Send user data to authenticated client using helper functions
         try:
@@ -1242,7 +1376,7 @@ async def handler(websocket):
             first_user = db.get_first_user()
             is_admin = (username == first_user)
             log_admin_check(username, first_user, is_admin, context="init message")
-            user_data = json.dumps({
+            user_data = to_json({
                 'type': 'init',
                 'username': username,
                 **current_avatar,
@@ -1268,35 +1402,26 @@ async def handler(websocket):
                 'set_at': set_at.isoformat() if set_at and hasattr(set_at, 'isoformat') else None,
                 'max_message_length': admin_settings.get('max_message_length', 2000)
             }
-            await websocket.send_str(json.dumps(announcement_data))
+            await websocket.send_str(to_json(announcement_data))
             
             # Deprecated: Send old message history for backward compatibility
             if messages:
-                history_message = json.dumps({
-                    'type': 'history',
-                    'messages': messages[-MAX_HISTORY:]
-                })
-                await websocket.send_str(history_message)
+                await websocket.send_str(get_history_frame())
             
             # Notify others about new user joining
-            join_message = json.dumps({
-                'type': 'system',
-                'content': f'{username} joined the chat',
-                'timestamp': datetime.now(timezone.utc).isoformat()
-            })
+            join_message = system_message(f'{username} joined the chat')
             await broadcast(join_message, exclude=websocket)
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} joined chat")
+            logger.info("%s joined chat", username)
         except Exception as e:
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] ERROR: Failed to send init message to {username}: {e}", flush=True)
-            traceback.print_exc()
+            logger.exception("Failed to send init message to %s: %s", username, e)
             # Send error message to client
             try:
-                await websocket.send_str(json.dumps({
+                await websocket.send_str(to_json({
                     'type': 'error',
                     'message': 'Connection error. Please refresh the page and try again.'
                 }))
             except Exception as send_error:
-                print(f"[{datetime.now().strftime('%H:%M:%S')}] ERROR: Could not send error message: {send_error}", flush=True)
+                logger.error("Could not send error message: %s", send_error)
             # Close connection to force client to reconnect
             await websocket.close()
             return
@@ -1305,8 +1430,14 @@ async def handler(websocket):
         async for msg in websocket:
             if msg.type == web.WSMsgType.TEXT:
                 try:
-                    data = json.loads(msg.data)
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Received message type: {data.get('type')}", flush=True)
+                    data = orjson.loads(msg.data)
+                    
+                    # Drop messages from clients sending faster than the rate limit
+                    message_bucket = signaling_bucket if data.get('type') in SIGNALING_MESSAGE_TYPES else bucket
+                    if not message_bucket.consume():
+                        await websocket.send_str(RATE_LIMITED_FRAME)
+                        continue
+                    logger.info("Received message type: %s", data.get('type'))
                     
                     if data.get('type') == 'message':
                         msg_content = data.get('content', '')
@@ -1319,7 +1450,7 @@ async def handler(websocket):
                         max_length = admin_settings.get('max_message_length', 2000)
                         
                         if len(msg_content) > max_length:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': f'Message exceeds maximum length of {max_length} characters'
                             }))
@@ -1354,8 +1485,8 @@ async def handler(websocket):
                                         )
                                         
                                         # Broadcast to server members
-                                        await broadcast_to_server(server_id, json.dumps(msg_obj))
-                                        print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} sent message in {server_id}/{channel_id}")
+                                        await broadcast_to_server(server_id, to_json(msg_obj))
+                                        logger.info("%s sent message in %s/%s", username, server_id, channel_id)
                         
                         elif context == 'dm' and context_id:
                             # Direct message - verify DM exists and user is participant
@@ -1381,9 +1512,9 @@ async def handler(websocket):
                                     if dm['dm_id'] == context_id:
                                         participants = [dm['user1'], dm['user2']]
                                         for participant in participants:
-                                            await send_to_user(participant, json.dumps(msg_obj))
+                                            await send_to_user(participant, to_json(msg_obj))
                                         break
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] DM from {username} in {context_id}")
+                                logger.info("DM from %s in %s", username, context_id)
                         
                         else:
                             # Global chat (backward compatibility)
@@ -1396,11 +1527,10 @@ async def handler(websocket):
                                 message_key=message_key
                             )
                             
-                            messages.append(msg_obj)
-                            if len(messages) > MAX_HISTORY:
-                                messages.pop(0)
-                            await broadcast(json.dumps(msg_obj))
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} sent global message")
+                            msg_json = to_json(msg_obj)
+                            add_to_history(msg_json)
+                            await broadcast(msg_json)
+                            logger.info("%s sent global message", username)
                     
                     elif data.get('type') == 'create_server':
                         server_name = data.get('name', '').strip()
@@ -1413,7 +1543,7 @@ async def handler(websocket):
                             if max_servers_per_user > 0:
                                 user_servers = db.get_user_servers(username)
                                 if len(user_servers) >= max_servers_per_user:
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(to_json({
                                         'type': 'error',
                                         'message': f'Maximum servers per user ({max_servers_per_user}) reached'
                                     }))
@@ -1427,7 +1557,7 @@ async def handler(websocket):
                             # Create default general channel
                             db.create_channel(channel_id, server_id, 'general', 'text')
                             
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'server_created',
                                 'server': {
                                     'id': server_id,
@@ -1439,14 +1569,14 @@ async def handler(websocket):
                                     'channels': [{'id': channel_id, 'name': 'general', 'type': 'text'}]
                                 }
                             }))
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} created server: {server_name}")
+                            logger.info("%s created server: %s", username, server_name)
                     
                     elif data.get('type') == 'join_server':
                         server_id = data.get('server_id', '')
                         if server_id in servers:
                             servers[server_id]['members'].add(username)
                             
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'server_joined',
                                 'server': {
                                     'id': server_id,
@@ -1480,7 +1610,7 @@ async def handler(websocket):
                                 for msg in channel_messages:
                                     msg['reactions'] = reactions_map.get(msg['id'], [])
                             
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'channel_history',
                                 'server_id': server_id,
                                 'channel_id': channel_id,
@@ -1506,7 +1636,7 @@ async def handler(websocket):
                                 for dm_msg in dm_messages:
                                     dm_msg['reactions'] = reactions_map.get(dm_msg['id'], [])
                             
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'dm_history',
                                 'dm_id': dm_id,
                                 'messages': dm_messages
@@ -1517,7 +1647,7 @@ async def handler(websocket):
                         new_content = data.get('content', '').strip()
                         
                         if not message_id or not new_content:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Invalid message edit request'
                             }))
@@ -1526,7 +1656,7 @@ async def handler(websocket):
                         # Get the message
                         message = db.get_message(message_id)
                         if not message:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Message not found'
                             }))
@@ -1534,7 +1664,7 @@ async def handler(websocket):
                         
                         # Check if message is deleted
                         if message.get('deleted'):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Cannot edit a deleted message'
                             }))
@@ -1563,7 +1693,7 @@ async def handler(websocket):
                                             break
                         
                         if not can_edit:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'You do not have permission to edit this message'
                             }))
@@ -1573,7 +1703,7 @@ async def handler(websocket):
                         admin_settings = db.get_admin_settings()
                         max_length = admin_settings.get('max_message_length', 2000)
                         if len(new_content) > max_length:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': f'Message exceeds maximum length of {max_length} characters'
                             }))
@@ -1596,15 +1726,15 @@ async def handler(websocket):
                             
                             if message['context_type'] == 'server':
                                 server_id = message['context_id'].split('/')[0]
-                                await broadcast_to_server(server_id, json.dumps(edit_notification))
+                                await broadcast_to_server(server_id, to_json(edit_notification))
                             elif message['context_type'] == 'dm':
                                 # Send to both DM participants using helper
-                                await broadcast_to_dm_participants(username, message['context_id'], json.dumps(edit_notification))
+                                await broadcast_to_dm_participants(username, message['context_id'], to_json(edit_notification))
                             
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} edited message {message_id}")
+                            logger.info("%s edited message %s", username, message_id)
                         else:
                             # Edit failed - could be due to message being deleted by another user
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Failed to edit message. The message may have been deleted.'
                             }))
@@ -1613,7 +1743,7 @@ async def handler(websocket):
                         message_id = data.get('message_id')
                         
                         if not message_id:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Invalid message delete request'
                             }))
@@ -1622,7 +1752,7 @@ async def handler(websocket):
                         # Get the message
                         message = db.get_message(message_id)
                         if not message:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Message not found'
                             }))
@@ -1630,7 +1760,7 @@ async def handler(websocket):
                         
                         # Check if message is already deleted
                         if message.get('deleted'):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Message is already deleted'
                             }))
@@ -1659,7 +1789,7 @@ async def handler(websocket):
                                             break
                         
                         if not can_delete:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'You do not have permission to delete this message'
                             }))
@@ -1677,15 +1807,15 @@ async def handler(websocket):
                             
                             if message['context_type'] == 'server':
                                 server_id = message['context_id'].split('/')[0]
-                                await broadcast_to_server(server_id, json.dumps(delete_notification))
+                                await broadcast_to_server(server_id, to_json(delete_notification))
                             elif message['context_type'] == 'dm':
                                 # Send to both DM participants using helper
-                                await broadcast_to_dm_participants(username, message['context_id'], json.dumps(delete_notification))
+                                await broadcast_to_dm_participants(username, message['context_id'], to_json(delete_notification))
                             
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} deleted message {message_id}")
+                            logger.info("%s deleted message %s", username, message_id)
                         else:
                             # Delete failed - message may already be deleted
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Failed to delete message. It may already be deleted.'
                             }))
@@ -1694,7 +1824,7 @@ async def handler(websocket):
                         attachment_id = data.get('attachment_id')
                         
                         if not attachment_id:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Invalid attachment delete request'
                             }))
@@ -1703,7 +1833,7 @@ async def handler(websocket):
                         # Get the attachment to find its message
                         attachment = db.get_attachment(attachment_id)
                         if not attachment:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Attachment not found'
                             }))
@@ -1712,7 +1842,7 @@ async def handler(websocket):
                         # Get the message to check permissions
                         message = db.get_message(attachment['message_id'])
                         if not message:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Associated message not found'
                             }))
@@ -1741,7 +1871,7 @@ async def handler(websocket):
                                             break
                         
                         if not can_delete:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'You do not have permission to delete this attachment'
                             }))
@@ -1760,14 +1890,14 @@ async def handler(websocket):
                             
                             if message['context_type'] == 'server':
                                 server_id = message['context_id'].split('/')[0]
-                                await broadcast_to_server(server_id, json.dumps(delete_notification))
+                                await broadcast_to_server(server_id, to_json(delete_notification))
                             elif message['context_type'] == 'dm':
                                 # Send to both DM participants
-                                await broadcast_to_dm_participants(username, message['context_id'], json.dumps(delete_notification))
+                                await broadcast_to_dm_participants(username, message['context_id'], to_json(delete_notification))
                             
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} deleted attachment {attachment_id}")
+                            logger.info("%s deleted attachment %s", username, attachment_id)
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Failed to delete attachment'
                             }))
@@ -1792,7 +1922,7 @@ async def handler(websocket):
                                         **avatar_data
                                     })
                         
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(to_json({
                             'type': 'search_results',
                             'results': results[:20]  # Limit to 20 results
                         }))
@@ -1808,13 +1938,13 @@ async def handler(websocket):
                             
                             # Check if already friends
                             if friend_username in friends:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'error',
                                     'message': 'Already friends with this user'
                                 }))
                             # Check if request already sent
                             elif friend_username in requests_sent:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'error',
                                     'message': 'Friend request already sent'
                                 }))
@@ -1825,7 +1955,7 @@ async def handler(websocket):
                                 
                                 friend_avatar = get_avatar_data(friend_username)
                                 friend_profile = get_profile_data(friend_username)
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'friend_added',
                                     'username': friend_username,
                                     **friend_avatar,
@@ -1835,20 +1965,20 @@ async def handler(websocket):
                                 # Notify the other user
                                 user_avatar = get_avatar_data(username)
                                 user_profile = get_profile_data(username)
-                                await send_to_user(friend_username, json.dumps({
+                                await send_to_user(friend_username, to_json({
                                     'type': 'friend_added',
                                     'username': username,
                                     **user_avatar,
                                     **user_profile
                                 }))
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} and {friend_username} are now friends (mutual request)")
+                                logger.info("%s and %s are now friends (mutual request)", username, friend_username)
                             else:
                                 # Send friend request
                                 db.add_friend_request(username, friend_username)
                                 
                                 friend_avatar = get_avatar_data(friend_username)
                                 friend_profile = get_profile_data(friend_username)
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'friend_request_sent',
                                     'username': friend_username,
                                     **friend_avatar,
@@ -1858,13 +1988,13 @@ async def handler(websocket):
                                 # Notify the other user
                                 user_avatar = get_avatar_data(username)
                                 user_profile = get_profile_data(username)
-                                await send_to_user(friend_username, json.dumps({
+                                await send_to_user(friend_username, to_json({
                                     'type': 'friend_request_received',
                                     'username': username,
                                     **user_avatar,
                                     **user_profile
                                 }))
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} sent friend request to {friend_username}")
+                                logger.info("%s sent friend request to %s", username, friend_username)
                     
                     elif data.get('type') == 'remove_friend':
                         friend_username = data.get('username', '').strip()
@@ -1873,7 +2003,7 @@ async def handler(websocket):
                         if friend_username in friends:
                             db.remove_friendship(username, friend_username)
                             
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'friend_removed',
                                 'username': friend_username
                             }))
@@ -1889,7 +2019,7 @@ async def handler(websocket):
                             
                             requester_avatar = get_avatar_data(requester_username)
                             requester_profile = get_profile_data(requester_username)
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'friend_request_approved',
                                 'username': requester_username,
                                 **requester_avatar,
@@ -1899,13 +2029,13 @@ async def handler(websocket):
                             # Notify the requester
                             user_avatar = get_avatar_data(username)
                             user_profile = get_profile_data(username)
-                            await send_to_user(requester_username, json.dumps({
+                            await send_to_user(requester_username, to_json({
                                 'type': 'friend_request_accepted',
                                 'username': username,
                                 **user_avatar,
                                 **user_profile
                             }))
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} approved friend request from {requester_username}")
+                            logger.info("%s approved friend request from %s", username, requester_username)
                     
                     elif data.get('type') == 'deny_friend_request':
                         # Deny a friend request
@@ -1916,13 +2046,13 @@ async def handler(websocket):
                             # Remove the request
                             db.remove_friendship(requester_username, username)
                             
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'friend_request_denied',
                                 'username': requester_username
                             }))
                             
                             # Optionally notify the requester (not doing this for privacy)
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} denied friend request from {requester_username}")
+                            logger.info("%s denied friend request from %s", username, requester_username)
                     
                     elif data.get('type') == 'cancel_friend_request':
                         # Cancel a sent friend request
@@ -1933,17 +2063,17 @@ async def handler(websocket):
                             # Remove the request
                             db.remove_friendship(username, friend_username)
                             
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'friend_request_cancelled',
                                 'username': friend_username
                             }))
                             
                             # Notify the other user
-                            await send_to_user(friend_username, json.dumps({
+                            await send_to_user(friend_username, to_json({
                                 'type': 'friend_request_cancelled_by_sender',
                                 'username': username
                             }))
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} cancelled friend request to {friend_username}")
+                            logger.info("%s cancelled friend request to %s", username, friend_username)
                     
                     elif data.get('type') == 'start_dm':
                         friend_username = data.get('username', '').strip()
@@ -1963,12 +2093,12 @@ async def handler(websocket):
                                     **friend_profile
                                 }
                             }
-                            await websocket.send_str(json.dumps(dm_info))
+                            await websocket.send_str(to_json(dm_info))
                             
                             # Notify the other user
                             user_avatar = get_avatar_data(username)
                             user_profile = get_profile_data(username)
-                            await send_to_user(friend_username, json.dumps({
+                            await send_to_user(friend_username, to_json({
                                 'type': 'dm_started',
                                 'dm': {
                                     'id': dm_id,
@@ -1983,12 +2113,12 @@ async def handler(websocket):
                         invite_code = generate_invite_code()
                         db.create_invite_code(invite_code, username, 'global')
                         
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(to_json({
                             'type': 'invite_code',
                             'code': invite_code,
                             'message': f'Invite code generated: {invite_code}'
                         }))
-                        print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} generated invite code: {invite_code}")
+                        logger.info("%s generated invite code: %s", username, invite_code)
                     
                     # Admin configuration handlers
                     elif data.get('type') == 'check_admin':
@@ -1996,7 +2126,7 @@ async def handler(websocket):
                         is_admin = (username == first_user)
                         log_admin_check(username, first_user, is_admin, context="check_admin request")
                         
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(to_json({
                             'type': 'admin_status',
                             'is_admin': is_admin,
                             'first_user': first_user
@@ -2017,7 +2147,7 @@ async def handler(websocket):
                             # NOTE: The raw 2FA secret is sent only for initial authenticator setup.
                             # Clients must NOT store this value and should use it solely to configure
                             # the authenticator app (e.g., via QR code generation) and then discard it.
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': '2fa_setup',
                                 'secret': secret,
                                 'qr_code': qr_code,
@@ -2025,7 +2155,7 @@ async def handler(websocket):
                                 'warning': 'The 2FA secret is sensitive. Do NOT store it; use it only to set up your authenticator app and then discard it.'
                             }))
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Failed to setup 2FA'
                             }))
@@ -2035,7 +2165,7 @@ async def handler(websocket):
                         totp_code = data.get('code', '').strip()
                         
                         if not totp_code:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Verification code required'
                             }))
@@ -2044,7 +2174,7 @@ async def handler(websocket):
                         # Get the secret
                         twofa_data = db.get_2fa_secret(username)
                         if not twofa_data:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'No 2FA setup found. Please start setup again.'
                             }))
@@ -2054,18 +2184,18 @@ async def handler(websocket):
                         if verify_2fa_token(twofa_data['secret'], totp_code):
                             # Enable 2FA
                             if db.enable_2fa(username):
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': '2fa_enabled',
                                     'message': 'Two-factor authentication enabled successfully'
                                 }))
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] 2FA enabled for user: {username}")
+                                logger.info("2FA enabled for user: %s", username)
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'error',
                                     'message': 'Failed to enable 2FA'
                                 }))
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Invalid verification code'
                             }))
@@ -2076,7 +2206,7 @@ async def handler(websocket):
                         totp_code = data.get('code', '').strip()
                         
                         if not password:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Password required to disable 2FA'
                             }))
@@ -2084,8 +2214,8 @@ async def handler(websocket):
                         
                         # Verify password
                         user = db.get_user(username)
-                        if not user or not verify_password(password, user['password_hash']):
-                            await websocket.send_str(json.dumps({
+                        if not user or not await verify_password(password, user['password_hash']):
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Invalid password'
                             }))
@@ -2095,7 +2225,7 @@ async def handler(websocket):
                         twofa_data = db.get_2fa_secret(username)
                         if twofa_data and twofa_data.get('enabled'):
                             if not totp_code:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'error',
                                     'message': '2FA code or backup code required to disable 2FA'
                                 }))
@@ -2108,7 +2238,7 @@ async def handler(websocket):
                                 valid_code = True
                             
                             if not valid_code:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'error',
                                     'message': 'Invalid 2FA code'
                                 }))
@@ -2116,13 +2246,13 @@ async def handler(websocket):
                         
                         # Disable 2FA
                         if db.disable_2fa(username):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': '2fa_disabled',
                                 'message': 'Two-factor authentication disabled'
                             }))
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] 2FA disabled for user: {username}")
+                            logger.info("2FA disabled for user: %s", username)
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Failed to disable 2FA'
                             }))
@@ -2132,7 +2262,7 @@ async def handler(websocket):
                         twofa_data = db.get_2fa_secret(username)
                         enabled = twofa_data is not None and twofa_data.get('enabled', False)
                         
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(to_json({
                             'type': '2fa_status',
                             'enabled': enabled
                         }))
@@ -2159,13 +2289,13 @@ async def handler(websocket):
                                 'announcement_duration_minutes': settings.get('announcement_duration_minutes', 60),
                                 'announcement_set_at': settings.get('announcement_set_at')
                             }
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'admin_settings',
                                 'settings': filtered_settings
                             }))
                         else:
                             # Admin users get all settings
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'admin_settings',
                                 'settings': settings
                             }))
@@ -2174,7 +2304,7 @@ async def handler(websocket):
                         # Verify user is admin
                         first_user = db.get_first_user()
                         if username != first_user:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Access denied. Admin only.'
                             }))
@@ -2186,7 +2316,7 @@ async def handler(websocket):
                                 # Validate message length
                                 message = settings.get('announcement_message', '')
                                 if len(message) > 500:
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(to_json({
                                         'type': 'error',
                                         'message': 'Announcement message cannot exceed 500 characters'
                                     }))
@@ -2195,7 +2325,7 @@ async def handler(websocket):
                                 # Validate duration
                                 duration = settings.get('announcement_duration_minutes')
                                 if duration is None or not isinstance(duration, (int, float)):
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(to_json({
                                         'type': 'error',
                                         'message': 'Invalid announcement duration value'
                                     }))
@@ -2203,7 +2333,7 @@ async def handler(websocket):
                                 
                                 duration = int(duration)
                                 if duration < 1 or duration > 10080:
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(to_json({
                                         'type': 'error',
                                         'message': 'Announcement duration must be between 1 and 10080 minutes'
                                     }))
@@ -2228,7 +2358,7 @@ async def handler(websocket):
                             success = db.update_admin_settings(settings)
                             
                             if success:
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] Admin {username} updated settings: {settings}")
+                                logger.info("Admin %s updated settings: %s", username, settings)
                                 
                                 # Broadcast announcement update to all connected clients
                                 set_at = settings.get('announcement_set_at')
@@ -2243,16 +2373,16 @@ async def handler(websocket):
                                 
                                 for client_ws in clients.keys():
                                     try:
-                                        await client_ws.send_str(json.dumps(announcement_data))
+                                        await client_ws.send_str(to_json(announcement_data))
                                     except Exception:
                                         pass  # Ignore errors sending to individual clients
                                 
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'settings_saved',
                                     'message': 'Settings saved successfully'
                                 }))
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'error',
                                     'message': 'Failed to save settings'
                                 }))
@@ -2261,7 +2391,7 @@ async def handler(websocket):
                         # Verify user is admin
                         first_user = db.get_first_user()
                         if username != first_user:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Access denied. Admin only.'
                             }))
@@ -2271,7 +2401,7 @@ async def handler(websocket):
                             
                             success, message = email_sender.test_connection()
                             
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'smtp_test_result',
                                 'success': success,
                                 'message': message
@@ -2286,7 +2416,7 @@ async def handler(websocket):
                         refreshed_requests_sent, refreshed_requests_received = build_friend_requests_data(username)
                         
                         # Send synced data to client
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(to_json({
                             'type': 'data_synced',
                             'servers': refreshed_servers,
                             'dms': refreshed_dms,
@@ -2294,7 +2424,7 @@ async def handler(websocket):
                             'friend_requests_sent': refreshed_requests_sent,
                             'friend_requests_received': refreshed_requests_received
                         }))
-                        print(f"[{datetime.now().strftime('%H:%M:%S')}] Data synced for {username}")
+                        logger.info("Data synced for %s", username)
                     
                     # Server settings handlers
                     elif data.get('type') == 'rename_server':
@@ -2308,14 +2438,14 @@ async def handler(websocket):
                                 db.update_server_name(server_id, new_name)
                                 
                                 # Notify all server members
-                                await broadcast_to_server(server_id, json.dumps({
+                                await broadcast_to_server(server_id, to_json({
                                     'type': 'server_renamed',
                                     'server_id': server_id,
                                     'name': new_name
                                 }))
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} renamed server {old_name} to {new_name}")
+                                logger.info("%s renamed server %s to %s", username, old_name, new_name)
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'error',
                                     'message': 'You do not have permission to access server settings'
                                 }))
@@ -2328,15 +2458,15 @@ async def handler(websocket):
                             invite_code = generate_invite_code()
                             db.create_invite_code(invite_code, username, 'server', server_id)
                             
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'server_invite_code',
                                 'server_id': server_id,
                                 'code': invite_code,
                                 'message': f'Server invite code generated: {invite_code}'
                             }))
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} generated invite for server {server_id}: {invite_code}")
+                            logger.info("%s generated invite for server %s: %s", username, server_id, invite_code)
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'You do not have permission to create server invites'
                             }))
@@ -2358,13 +2488,13 @@ async def handler(websocket):
                                         item[key] = value.isoformat()
                                 serialized_logs.append(item)
                             
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'server_invite_usage',
                                 'server_id': server_id,
                                 'usage_logs': serialized_logs
                             }))
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'You do not have permission to view invite usage'
                             }))
@@ -2389,7 +2519,7 @@ async def handler(websocket):
                                 
                                 # Check if server has reached member limit (0 = unlimited)
                                 if max_members > 0 and len(members) >= max_members:
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(to_json({
                                         'type': 'error',
                                         'message': f'Server has reached maximum members ({max_members})'
                                     }))
@@ -2404,7 +2534,7 @@ async def handler(websocket):
                                 
                                 # Get channels for response
                                 channels = db.get_server_channels(server_id)
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'server_joined',
                                     'server': {
                                         'id': server_id,
@@ -2421,19 +2551,19 @@ async def handler(websocket):
                                 }))
                                 
                                 # Notify other server members
-                                await broadcast_to_server(server_id, json.dumps({
+                                await broadcast_to_server(server_id, to_json({
                                     'type': 'member_joined',
                                     'server_id': server_id,
                                     'username': username
                                 }), exclude=websocket)
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} joined server {server_id} via invite")
+                                logger.info("%s joined server %s via invite", username, server_id)
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'error',
                                     'message': 'You are already a member of this server'
                                 }))
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Invalid server invite code'
                             }))
@@ -2455,27 +2585,27 @@ async def handler(websocket):
                                     db.update_member_permissions(server_id, target_username, permissions)
                                     
                                     # Notify the user whose permissions were updated
-                                    await send_to_user(target_username, json.dumps({
+                                    await send_to_user(target_username, to_json({
                                         'type': 'permissions_updated',
                                         'server_id': server_id,
                                         'permissions': permissions
                                     }))
                                     
                                     # Confirm to the owner
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(to_json({
                                         'type': 'permissions_updated_success',
                                         'server_id': server_id,
                                         'username': target_username,
                                         'permissions': permissions
                                     }))
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} updated permissions for {target_username} in server {server_id}")
+                                    logger.info("%s updated permissions for %s in server %s", username, target_username, server_id)
                                 else:
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(to_json({
                                         'type': 'error',
                                         'message': 'Cannot update permissions for this user'
                                     }))
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'error',
                                     'message': 'Only the server owner can update permissions'
                                 }))
@@ -2512,7 +2642,7 @@ async def handler(websocket):
                                         }
                                     members_list.append(member_data)
                                 
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'server_members',
                                     'server_id': server_id,
                                     'members': members_list
@@ -2520,50 +2650,50 @@ async def handler(websocket):
                     
                     # Role management handlers
                     elif data.get('type') == 'create_role':
-                        print(f"[{datetime.now().strftime('%H:%M:%S')}] Received create_role request from {username}", flush=True)
+                        logger.info("Received create_role request from %s", username)
                         server_id = data.get('server_id', '')
                         role_name = data.get('name', '').strip()
                         color = data.get('color', '#99AAB5')
                         permissions = data.get('permissions', {})
                         
-                        print(f"[{datetime.now().strftime('%H:%M:%S')}] server_id={server_id}, role_name={role_name}, color={color}", flush=True)
+                        logger.info("server_id=%s, role_name=%s, color=%s", server_id, role_name, color)
                         
                         server = db.get_server(server_id)
                         if server and role_name:
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Server found, checking ownership")
+                            logger.info("Server found, checking ownership")
                             if username == server['owner']:
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] User is owner, creating role")
+                                logger.info("User is owner, creating role")
                                 role_id = get_next_role_id()
                                 
                                 # Get highest position and add 1
                                 existing_roles = db.get_server_roles(server_id)
                                 position = max([r['position'] for r in existing_roles] + [0]) + 1
                                 
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] Creating role with position {position}")
+                                logger.info("Creating role with position %s", position)
                                 if db.create_role(role_id, server_id, role_name, color, position, permissions):
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Role created in DB, fetching...")
+                                    logger.info("Role created in DB, fetching...")
                                     role = db.get_role(role_id)
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Role fetched: {role}")
+                                    logger.info("Role fetched: %s", role)
                                     
                                     # Broadcast to all server members
                                     serialized_role = serialize_role(role)
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Serialized role: {serialized_role}")
-                                    await broadcast_to_server(server_id, json.dumps({
+                                    logger.info("Serialized role: %s", serialized_role)
+                                    await broadcast_to_server(server_id, to_json({
                                         'type': 'role_created',
                                         'server_id': server_id,
                                         'role': serialized_role
                                     }))
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} created role {role_name} in server {server_id}")
+                                    logger.info("%s created role %s in server %s", username, role_name, server_id)
                                 else:
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Failed to create role in DB")
+                                    logger.info("Failed to create role in DB")
                             else:
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] User {username} is not owner of server")
-                                await websocket.send_str(json.dumps({
+                                logger.info("User %s is not owner of server", username)
+                                await websocket.send_str(to_json({
                                     'type': 'error',
                                     'message': 'Only the server owner can create roles'
                                 }))
                         else:
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Server not found or role_name empty")
+                            logger.info("Server not found or role_name empty")
 
                     
                     elif data.get('type') == 'update_role':
@@ -2580,14 +2710,14 @@ async def handler(websocket):
                                     updated_role = db.get_role(role_id)
                                     
                                     # Broadcast to all server members
-                                    await broadcast_to_server(role['server_id'], json.dumps({
+                                    await broadcast_to_server(role['server_id'], to_json({
                                         'type': 'role_updated',
                                         'server_id': role['server_id'],
                                         'role': serialize_role(updated_role)
                                     }))
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} updated role {role_id}")
+                                    logger.info("%s updated role %s", username, role_id)
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'error',
                                     'message': 'Only the server owner can update roles'
                                 }))
@@ -2601,14 +2731,14 @@ async def handler(websocket):
                             if server and username == server['owner']:
                                 if db.delete_role(role_id):
                                     # Broadcast to all server members
-                                    await broadcast_to_server(role['server_id'], json.dumps({
+                                    await broadcast_to_server(role['server_id'], to_json({
                                         'type': 'role_deleted',
                                         'server_id': role['server_id'],
                                         'role_id': role_id
                                     }))
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} deleted role {role_id}")
+                                    logger.info("%s deleted role %s", username, role_id)
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'error',
                                     'message': 'Only the server owner can delete roles'
                                 }))
@@ -2623,23 +2753,23 @@ async def handler(websocket):
                         if server and role and username == server['owner']:
                             if db.assign_role(server_id, target_username, role_id):
                                 # Notify the user who got the role
-                                await send_to_user(target_username, json.dumps({
+                                await send_to_user(target_username, to_json({
                                     'type': 'role_assigned',
                                     'server_id': server_id,
                                     'role': role
                                 }))
                                 
                                 # Broadcast to server
-                                await broadcast_to_server(server_id, json.dumps({
+                                await broadcast_to_server(server_id, to_json({
                                     'type': 'member_role_updated',
                                     'server_id': server_id,
                                     'username': target_username,
                                     'role_id': role_id,
                                     'action': 'added'
                                 }))
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} assigned role {role_id} to {target_username}")
+                                logger.info("%s assigned role %s to %s", username, role_id, target_username)
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Only the server owner can assign roles'
                             }))
@@ -2653,23 +2783,23 @@ async def handler(websocket):
                         if server and username == server['owner']:
                             if db.remove_role_from_user(server_id, target_username, role_id):
                                 # Notify the user
-                                await send_to_user(target_username, json.dumps({
+                                await send_to_user(target_username, to_json({
                                     'type': 'role_removed',
                                     'server_id': server_id,
                                     'role_id': role_id
                                 }))
                                 
                                 # Broadcast to server
-                                await broadcast_to_server(server_id, json.dumps({
+                                await broadcast_to_server(server_id, to_json({
                                     'type': 'member_role_updated',
                                     'server_id': server_id,
                                     'username': target_username,
                                     'role_id': role_id,
                                     'action': 'removed'
                                 }))
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} removed role {role_id} from {target_username}")
+                                logger.info("%s removed role %s from %s", username, role_id, target_username)
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Only the server owner can remove roles'
                             }))
@@ -2685,7 +2815,7 @@ async def handler(websocket):
                             
                             if username in member_usernames:
                                 roles = db.get_server_roles(server_id)
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'server_roles',
                                     'server_id': server_id,
                                     'roles': [serialize_role(r) for r in roles]
@@ -2698,7 +2828,7 @@ async def handler(websocket):
                         server = db.get_server(server_id)
                         if server:
                             roles = db.get_user_roles(server_id, target_username)
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'user_roles',
                                 'server_id': server_id,
                                 'username': target_username,
@@ -2721,7 +2851,7 @@ async def handler(websocket):
                                 if max_channels > 0:
                                     server_channels = db.get_server_channels(server_id)
                                     if len(server_channels) >= max_channels:
-                                        await websocket.send_str(json.dumps({
+                                        await websocket.send_str(to_json({
                                             'type': 'error',
                                             'message': f'Maximum channels per server ({max_channels}) reached'
                                         }))
@@ -2731,15 +2861,15 @@ async def handler(websocket):
                                 db.create_channel(channel_id, server_id, channel_name, channel_type)
                                 
                                 # Notify all server members
-                                channel_info = json.dumps({
+                                channel_info = to_json({
                                     'type': 'channel_created',
                                     'server_id': server_id,
                                     'channel': {'id': channel_id, 'name': channel_name, 'type': channel_type}
                                 })
                                 await broadcast_to_server(server_id, channel_info)
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} created {channel_type} channel: {channel_name}")
+                                logger.info("%s created %s channel: %s", username, channel_type, channel_name)
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'error',
                                     'message': 'You do not have permission to create channels'
                                 }))
@@ -2759,7 +2889,7 @@ async def handler(websocket):
                                 if max_channels > 0:
                                     server_channels = db.get_server_channels(server_id)
                                     if len(server_channels) >= max_channels:
-                                        await websocket.send_str(json.dumps({
+                                        await websocket.send_str(to_json({
                                             'type': 'error',
                                             'message': f'Maximum channels per server ({max_channels}) reached'
                                         }))
@@ -2769,15 +2899,15 @@ async def handler(websocket):
                                 db.create_channel(channel_id, server_id, channel_name, 'voice')
                                 
                                 # Notify all server members (use unified message type)
-                                channel_info = json.dumps({
+                                channel_info = to_json({
                                     'type': 'channel_created',
                                     'server_id': server_id,
                                     'channel': {'id': channel_id, 'name': channel_name, 'type': 'voice'}
                                 })
                                 await broadcast_to_server(server_id, channel_info)
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} created voice channel: {channel_name}")
+                                logger.info("%s created voice channel: %s", username, channel_name)
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'error',
                                     'message': 'You do not have permission to create channels'
                                 }))
@@ -2819,7 +2949,7 @@ async def handler(websocket):
                                 
                                 # Notify all server members about voice state change
                                 user_avatar = get_avatar_data(username)
-                                await broadcast_to_server(server_id, json.dumps({
+                                await broadcast_to_server(server_id, to_json({
                                     'type': 'voice_state_update',
                                     'server_id': server_id,
                                     'channel_id': channel_id,
@@ -2828,7 +2958,7 @@ async def handler(websocket):
                                     'state': 'joined',
                                     'voice_members': voice_members_list
                                 }))
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} joined voice channel {channel_id}")
+                                logger.info("%s joined voice channel %s", username, channel_id)
                     
                     elif data.get('type') == 'leave_voice_channel':
                         if username in voice_states:
@@ -2856,7 +2986,7 @@ async def handler(websocket):
                                         })
                                     
                                     # Notify all server members
-                                    await broadcast_to_server(server_id, json.dumps({
+                                    await broadcast_to_server(server_id, to_json({
                                         'type': 'voice_state_update',
                                         'server_id': server_id,
                                         'channel_id': channel_id,
@@ -2866,7 +2996,7 @@ async def handler(websocket):
                                     }))
                             
                             del voice_states[username]
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} left voice channel")
+                            logger.info("%s left voice channel", username)
                     
                     elif data.get('type') == 'voice_mute':
                         muted = data.get('muted', False)
@@ -2877,14 +3007,14 @@ async def handler(websocket):
                             # Notify others in the same voice channel OR direct call peer
                             if state.get('server_id') and state.get('channel_id'):
                                 # In a server voice channel
-                                await broadcast_to_server(state['server_id'], json.dumps({
+                                await broadcast_to_server(state['server_id'], to_json({
                                     'type': 'voice_mute_update',
                                     'username': username,
                                     'muted': muted
                                 }))
                             elif state.get('direct_call_peer'):
                                 # In a direct call
-                                await send_to_user(state['direct_call_peer'], json.dumps({
+                                await send_to_user(state['direct_call_peer'], to_json({
                                     'type': 'voice_mute_update',
                                     'username': username,
                                     'muted': muted
@@ -2910,7 +3040,7 @@ async def handler(websocket):
                                 
                                 # Validate size (base64 is ~33% larger than original)
                                 if len(avatar_data) > max_file_size * 1.5:
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(to_json({
                                         'type': 'error',
                                         'message': f'Avatar image too large. Maximum size is {max_file_size_mb}MB.'
                                     }))
@@ -2923,7 +3053,7 @@ async def handler(websocket):
                             
                             # Notify all friends about avatar change
                             for friend_username in db.get_friends(username):
-                                await send_to_user(friend_username, json.dumps({
+                                await send_to_user(friend_username, to_json({
                                     'type': 'avatar_update',
                                     'username': username,
                                     **avatar_update
@@ -2931,13 +3061,13 @@ async def handler(websocket):
                             
                             # Notify all servers the user is in
                             for server_id in db.get_user_servers(username):
-                                await broadcast_to_server(server_id, json.dumps({
+                                await broadcast_to_server(server_id, to_json({
                                     'type': 'avatar_update',
                                     'username': username,
                                     **avatar_update
                                 }))
                             
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'avatar_updated',
                                 **avatar_update
                             }))
@@ -2949,14 +3079,14 @@ async def handler(websocket):
                         
                         # Validate lengths
                         if len(bio) > 500:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Bio is too long. Maximum 500 characters.'
                             }))
                             continue
                         
                         if len(status_message) > 100:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Status message is too long. Maximum 100 characters.'
                             }))
@@ -2974,7 +3104,7 @@ async def handler(websocket):
                         
                         # Notify all friends about profile change
                         for friend_username in db.get_friends(username):
-                            await send_to_user(friend_username, json.dumps({
+                            await send_to_user(friend_username, to_json({
                                 'type': 'profile_update',
                                 'username': username,
                                 **profile_update
@@ -2982,14 +3112,14 @@ async def handler(websocket):
                         
                         # Notify all servers the user is in
                         for server_id in db.get_user_servers(username):
-                            await broadcast_to_server(server_id, json.dumps({
+                            await broadcast_to_server(server_id, to_json({
                                 'type': 'profile_update',
                                 'username': username,
                                 **profile_update
                             }))
                         
                         # Confirm to the user
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(to_json({
                             'type': 'profile_updated',
                             **profile_update
                         }))
@@ -3001,7 +3131,7 @@ async def handler(websocket):
                         
                         # Validate icon_type
                         if icon_type not in ['emoji', 'image']:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Invalid icon type. Must be "emoji" or "image".'
                             }))
@@ -3010,14 +3140,14 @@ async def handler(websocket):
                         # Verify user has permission to change server icon
                         server = db.get_server(server_id)
                         if not server:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Server not found'
                             }))
                             continue
                         
                         if not has_permission(server_id, username, 'access_settings'):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'You do not have permission to change the server icon'
                             }))
@@ -3031,7 +3161,7 @@ async def handler(websocket):
                         if icon_type == 'emoji':
                             icon = data.get('icon', '🏠').strip()
                             if not db.update_server_icon(server_id, icon, 'emoji', None):
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'error',
                                     'message': 'Failed to update server icon'
                                 }))
@@ -3042,7 +3172,7 @@ async def handler(websocket):
                             
                             # Validate icon_data is not empty
                             if not icon_data:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'error',
                                     'message': 'Icon image data is required'
                                 }))
@@ -3050,14 +3180,14 @@ async def handler(websocket):
                             
                             # Validate size (base64 is ~33% larger than original)
                             if len(icon_data) > max_file_size * 1.5:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'error',
                                     'message': f'Icon image too large. Maximum size is {max_file_size_mb}MB.'
                                 }))
                                 continue
                             
                             if not db.update_server_icon(server_id, None, 'image', icon_data):
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'error',
                                     'message': 'Failed to update server icon'
                                 }))
@@ -3072,13 +3202,13 @@ async def handler(websocket):
                         }
                         
                         # Notify all server members about icon change
-                        await broadcast_to_server(server_id, json.dumps({
+                        await broadcast_to_server(server_id, to_json({
                             'type': 'server_icon_update',
                             'server_id': server_id,
                             **icon_update
                         }))
                         
-                        print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} updated icon for server {server_id}")
+                        logger.info("%s updated icon for server %s", username, server_id)
                     
                     elif data.get('type') == 'set_notification_mode':
                         # Update user notification mode
@@ -3086,7 +3216,7 @@ async def handler(websocket):
                         
                         # Validate notification mode
                         if notification_mode not in ['all', 'mentions', 'none']:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'Invalid notification mode'
                             }))
@@ -3096,12 +3226,12 @@ async def handler(websocket):
                         if user:
                             db.update_notification_mode(username, notification_mode)
                             
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'notification_mode_updated',
                                 'notification_mode': notification_mode
                             }))
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(to_json({
                                 'type': 'error',
                                 'message': 'User not found'
                             }))
@@ -3116,14 +3246,14 @@ async def handler(websocket):
                             # Notify others in the same voice channel OR direct call peer
                             if state.get('server_id') and state.get('channel_id'):
                                 # In a server voice channel
-                                await broadcast_to_server(state['server_id'], json.dumps({
+                                await broadcast_to_server(state['server_id'], to_json({
                                     'type': 'voice_video_update',
                                     'username': username,
                                     'video': video
                                 }))
                             elif state.get('direct_call_peer'):
                                 # In a direct call
-                                await send_to_user(state['direct_call_peer'], json.dumps({
+                                await send_to_user(state['direct_call_peer'], to_json({
                                     'type': 'voice_video_update',
                                     'username': username,
                                     'video': video
@@ -3139,14 +3269,14 @@ async def handler(websocket):
                             # Notify others in the same voice channel OR direct call peer
                             if state.get('server_id') and state.get('channel_id'):
                                 # In a server voice channel
-                                await broadcast_to_server(state['server_id'], json.dumps({
+                                await broadcast_to_server(state['server_id'], to_json({
                                     'type': 'voice_screen_share_update',
                                     'username': username,
                                     'screen_sharing': screen_sharing
                                 }))
                             elif state.get('direct_call_peer'):
                                 # In a direct call
-                                await send_to_user(state['direct_call_peer'], json.dumps({
+                                await send_to_user(state['direct_call_peer'], to_json({
                                     'type': 'voice_screen_share_update',
                                     'username': username,
                                     'screen_sharing': screen_sharing
@@ -3180,14 +3310,14 @@ async def handler(websocket):
                             
                             # Allow if in same channel or direct call
                             if in_same_channel or in_direct_call:
-                                await send_to_user(target_user, json.dumps({
+                                await send_to_user(target_user, to_json({
                                     'type': 'switch_video_source_request',
                                     'from': username,
                                     'show_screen': show_screen
                                 }))
                             else:
                                 # Reject unauthorized switch requests
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'error',
                                     'message': 'Cannot request video source switch: target user is not in the same voice channel or direct call'
                                 }))
@@ -3202,14 +3332,14 @@ async def handler(websocket):
                             # Notify others in the same voice channel OR direct call peer
                             if state.get('server_id') and state.get('channel_id'):
                                 # In a server voice channel
-                                await broadcast_to_server(state['server_id'], json.dumps({
+                                await broadcast_to_server(state['server_id'], to_json({
                                     'type': 'video_source_changed_update',
                                     'username': username,
                                     'showing_screen': showing_screen
                                 }))
                             elif state.get('direct_call_peer'):
                                 # In a direct call
-                                await send_to_user(state['direct_call_peer'], json.dumps({
+                                await send_to_user(state['direct_call_peer'], to_json({
                                     'type': 'video_source_changed_update',
                                     'username': username,
                                     'showing_screen': showing_screen
@@ -3222,7 +3352,7 @@ async def handler(websocket):
                         context = data.get('context', {})
                         
                         if target_user:
-                            await send_to_user(target_user, json.dumps({
+                            await send_to_user(target_user, to_json({
                                 'type': 'webrtc_offer',
                                 'from': username,
                                 'offer': offer,
@@ -3234,7 +3364,7 @@ async def handler(websocket):
                         answer = data.get('answer')
                         
                         if target_user:
-                            await send_to_user(target_user, json.dumps({
+                            await send_to_user(target_user, to_json({
                                 'type': 'webrtc_answer',
                                 'from': username,
                                 'answer': answer
@@ -3245,7 +3375,7 @@ async def handler(websocket):
                         candidate = data.get('candidate')
                         
                         if target_user:
-                            await send_to_user(target_user, json.dumps({
+                            await send_to_user(target_user, to_json({
                                 'type': 'webrtc_ice_candidate',
                                 'from': username,
                                 'candidate': candidate
@@ -3261,7 +3391,7 @@ async def handler(websocket):
                             # Validate emoji name pattern (alphanumeric and underscores only)
                             import re
                             if not re.match(r'^[a-zA-Z0-9_]+$', emoji_name):
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'error',
                                     'message': 'Invalid emoji name format'
                                 }))
@@ -3269,7 +3399,7 @@ async def handler(websocket):
                             
                             # Validate name length
                             if len(emoji_name) > 50:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'error',
                                     'message': 'Emoji name too long'
                                 }))
@@ -3277,7 +3407,7 @@ async def handler(websocket):
                             
                             # Validate image data format and MIME type
                             if not image_data.startswith('data:image/'):
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'error',
                                     'message': 'Invalid image format'
                                 }))
@@ -3286,7 +3416,7 @@ async def handler(websocket):
                             # Check for allowed image types
                             allowed_types = ['data:image/png', 'data:image/jpeg', 'data:image/gif', 'data:image/webp']
                             if not any(image_data.startswith(t) for t in allowed_types):
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'error',
                                     'message': 'Unsupported image type'
                                 }))
@@ -3298,7 +3428,7 @@ async def handler(websocket):
                                 # Base64 encoding increases size by ~33%, so decode length gives approximate original size
                                 estimated_size = len(base64_data) * 3 / 4
                                 if estimated_size > 262144:  # 256KB
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(to_json({
                                         'type': 'error',
                                         'message': 'Image size exceeds limit'
                                     }))
@@ -3320,25 +3450,25 @@ async def handler(websocket):
                                         emoji = db.get_custom_emoji(emoji_id)
                                         
                                         # Broadcast to all server members
-                                        await broadcast_to_server(server_id, json.dumps({
+                                        await broadcast_to_server(server_id, to_json({
                                             'type': 'custom_emoji_added',
                                             'server_id': server_id,
                                             'emoji': emoji
                                         }))
                                         
                                         # Confirm to uploader
-                                        await websocket.send_str(json.dumps({
+                                        await websocket.send_str(to_json({
                                             'type': 'emoji_upload_success',
                                             'emoji': emoji
                                         }))
-                                        print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} uploaded emoji '{emoji_name}' to server {server_id}")
+                                        logger.info("%s uploaded emoji '%s' to server %s", username, emoji_name, server_id)
                                     else:
-                                        await websocket.send_str(json.dumps({
+                                        await websocket.send_str(to_json({
                                             'type': 'error',
                                             'message': 'Failed to create emoji'
                                         }))
                                 else:
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(to_json({
                                         'type': 'error',
                                         'message': 'Not authorized'
                                     }))
@@ -3354,7 +3484,7 @@ async def handler(websocket):
                                 
                                 if username in member_usernames:
                                     emojis = db.get_server_emojis(server_id)
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(to_json({
                                         'type': 'server_emojis',
                                         'server_id': server_id,
                                         'emojis': emojis
@@ -3371,19 +3501,19 @@ async def handler(websocket):
                                 if server and (username == server['owner'] or username == emoji['uploader']):
                                     if db.delete_custom_emoji(emoji_id):
                                         # Broadcast to all server members
-                                        await broadcast_to_server(emoji['server_id'], json.dumps({
+                                        await broadcast_to_server(emoji['server_id'], to_json({
                                             'type': 'custom_emoji_deleted',
                                             'server_id': emoji['server_id'],
                                             'emoji_id': emoji_id
                                         }))
                                         
-                                        await websocket.send_str(json.dumps({
+                                        await websocket.send_str(to_json({
                                             'type': 'emoji_delete_success',
                                             'emoji_id': emoji_id
                                         }))
-                                        print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} deleted emoji {emoji_id}")
+                                        logger.info("%s deleted emoji %s", username, emoji_id)
                                 else:
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(to_json({
                                         'type': 'error',
                                         'message': 'You do not have permission to delete this emoji'
                                     }))
@@ -3431,7 +3561,7 @@ async def handler(websocket):
                             # Broadcast to appropriate context (even for duplicates to keep clients in sync)
                             if message['context_type'] == 'server' and message['context_id']:
                                 server_id = message['context_id'].split('/')[0]
-                                await broadcast_to_server(server_id, json.dumps(reaction_update))
+                                await broadcast_to_server(server_id, to_json(reaction_update))
                             elif message['context_type'] == 'dm' and message['context_id']:
                                 # Get DM participants
                                 dm_users = db.get_user_dms(username)
@@ -3439,11 +3569,11 @@ async def handler(websocket):
                                     if dm['dm_id'] == message['context_id']:
                                         participants = [dm['user1'], dm['user2']]
                                         for participant in participants:
-                                            await send_to_user(participant, json.dumps(reaction_update))
+                                            await send_to_user(participant, to_json(reaction_update))
                                         break
                             
                             if reaction_added:
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} added reaction {emoji} to message {message_id}")
+                                logger.info("%s added reaction %s to message %s", username, emoji, message_id)
                     
                     elif data.get('type') == 'remove_reaction':
                         message_id = data.get('message_id')
@@ -3478,7 +3608,7 @@ async def handler(websocket):
                                 # Broadcast to appropriate context
                                 if message.get('context_type') == 'server' and message.get('context_id'):
                                     server_id = message['context_id'].split('/')[0]
-                                    await broadcast_to_server(server_id, json.dumps(reaction_update))
+                                    await broadcast_to_server(server_id, to_json(reaction_update))
                                 elif message.get('context_type') == 'dm' and message.get('context_id'):
                                     # Get DM participants (reuse if already fetched)
                                     if dm_users is None:
@@ -3488,10 +3618,10 @@ async def handler(websocket):
                                             participants = [dm.get('user1'), dm.get('user2')]
                                             for participant in participants:
                                                 if participant:
-                                                    await send_to_user(participant, json.dumps(reaction_update))
+                                                    await send_to_user(participant, to_json(reaction_update))
                                             break
                                 
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} removed reaction {emoji} from message {message_id}")
+                                logger.info("%s removed reaction %s from message %s", username, emoji, message_id)
                     
                     # Server purge settings handlers
                     elif data.get('type') == 'get_server_purge_settings':
@@ -3503,7 +3633,7 @@ async def handler(websocket):
                                 settings = db.get_server_settings(server_id)
                                 exemptions = db.get_channel_exemptions(server_id)
                                 
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'server_purge_settings',
                                     'server_id': server_id,
                                     'purge_schedule': settings['purge_schedule'] if settings else 0,
@@ -3522,7 +3652,7 @@ async def handler(websocket):
                                 try:
                                     purge_schedule = int(purge_schedule)
                                 except (TypeError, ValueError):
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(to_json({
                                         'type': 'error',
                                         'message': 'Invalid purge schedule type'
                                     }))
@@ -3530,7 +3660,7 @@ async def handler(websocket):
                                 
                                 valid_schedules = [0, 7, 30, 90, 180, 365]
                                 if purge_schedule not in valid_schedules:
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(to_json({
                                         'type': 'error',
                                         'message': 'Invalid purge schedule value'
                                     }))
@@ -3552,14 +3682,14 @@ async def handler(websocket):
                                     is_exempted = channel_id in validated_exemptions
                                     db.set_channel_exemption(server_id, channel_id, is_exempted)
                                 
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'server_purge_settings_updated',
                                     'server_id': server_id,
                                     'purge_schedule': purge_schedule
                                 }))
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} updated purge settings for server {server_id}")
+                                logger.info("%s updated purge settings for server %s", username, server_id)
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(to_json({
                                     'type': 'error',
                                     'message': 'Only the server owner can update purge settings'
                                 }))
@@ -3578,11 +3708,11 @@ async def handler(websocket):
                             voice_states[username] = create_voice_state(direct_call_peer=friend_username)
                             
                             # Notify the friend about incoming call
-                            await send_to_user(friend_username, json.dumps({
+                            await send_to_user(friend_username, to_json({
                                 'type': 'incoming_voice_call',
                                 'from': username
                             }))
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} calling {friend_username}")
+                            logger.info("%s calling %s", username, friend_username)
                     
                     elif data.get('type') == 'accept_voice_call':
                         caller_username = data.get('from', '').strip()
@@ -3608,7 +3738,7 @@ async def handler(websocket):
                             voice_states[username] = create_voice_state(direct_call_peer=caller_username)
                             voice_states[caller_username] = create_voice_state(direct_call_peer=username)
                             
-                            await send_to_user(caller_username, json.dumps({
+                            await send_to_user(caller_username, to_json({
                                 'type': 'voice_call_accepted',
                                 'from': username
                             }))
@@ -3626,22 +3756,21 @@ async def handler(websocket):
                                 if caller_state.get('direct_call_peer') == username:
                                     del voice_states[caller_username]
                             
-                            await send_to_user(caller_username, json.dumps({
+                            await send_to_user(caller_username, to_json({
                                 'type': 'voice_call_rejected',
                                 'from': username
                             }))
                         
-                except json.JSONDecodeError:
-                    print("Invalid JSON received")
+                except orjson.JSONDecodeError:
+                    logger.error("Invalid JSON received from %s", username)
                 except Exception as e:
-                    print(f"Error processing message: {e}")
-                    traceback.print_exc()
+                    logger.exception("Error processing message from %s: %s", username, e)
             elif msg.type == web.WSMsgType.ERROR:
-                print(f'WebSocket connection closed with exception {websocket.exception()}')
+                logger.error("WebSocket connection closed with exception %s", websocket.exception())
                 break
                 
     except Exception as e:
-        print(f"Error in handler: {e}")
+        logger.exception("Error in handler: %s", e)
     finally:
         # Unregister client
         if websocket in clients:
@@ -3676,7 +3805,7 @@ async def handler(websocket):
                             })
                         
                         # Notify all server members
-                        await broadcast_to_server(server_id, json.dumps({
+                        await broadcast_to_server(server_id, to_json({
                             'type': 'voice_state_update',
                             'server_id': server_id,
                             'channel_id': channel_id,
@@ -3686,7 +3815,7 @@ async def handler(websocket):
                         }))
                 elif direct_call_peer:
                     # User was in a direct call - notify peer
-                    await send_to_user(direct_call_peer, json.dumps({
+                    await send_to_user(direct_call_peer, to_json({
                         'type': 'direct_call_ended',
                         'from': username,
                         'reason': 'disconnected'
@@ -3695,19 +3824,15 @@ async def handler(websocket):
                 del voice_states[username]
             
             # Notify others about user leaving
-            leave_message = json.dumps({
-                'type': 'system',
-                'content': f'{username} left the chat',
-                'timestamp': datetime.now(timezone.utc).isoformat()
-            })
+            leave_message = system_message(f'{username} left the chat')
             await broadcast(leave_message)
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} left")
+            logger.info("%s left", username)
 
 
 async def http_handler(request):
     """Handle HTTP requests and serve static files."""
     path = request.path
-    print(f"[HTTP_HANDLER ENTRY] Received request for path: {path}")
+    logger.debug("Received request for path: %s", path)
     
     # Redirect root to index.html
     if path == '/':
@@ -3761,9 +3886,9 @@ async def http_handler(request):
             # Decode text files only
             if not is_binary:
                 content = binary_content.decode('utf-8')
-                print(f"[HTTP_HANDLER] Serving text {full_path}, size: {len(content)} chars")
+                logger.debug("Serving text %s, size: %s chars", full_path, len(content))
             else:
-                print(f"[HTTP_HANDLER] Serving binary {full_path}, size: {len(binary_content)} bytes")
+                logger.debug("Serving binary %s, size: %s bytes", full_path, len(binary_content))
             
             # Add cache control headers to prevent browser caching during development
             headers = {
@@ -3783,7 +3908,9 @@ async def http_handler(request):
 
 async def websocket_handler(request):
     """Handle WebSocket upgrade requests."""
-    ws = web.WebSocketResponse()
+    # permessage-deflate is disabled: compressing large frames such as the init
+    # payload costs more event loop time than it saves on the wire
+    ws = web.WebSocketResponse(compress=False)
     await ws.prepare(request)
     
     # Use the existing handler logic
@@ -3798,9 +3925,9 @@ async def cleanup_verification_codes_periodically():
         try:
             await asyncio.sleep(CLEANUP_INTERVAL_HOURLY)  # Run every hour
             db.cleanup_expired_verification_codes()
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] Cleaned up expired verification codes")
+            logger.info("Cleaned up expired verification codes")
         except Exception as e:
-            print(f"Error in periodic cleanup task: {e}")
+            logger.error("Error in periodic cleanup task: %s", e)
 
 
 async def cleanup_old_attachments_periodically():
@@ -3815,9 +3942,9 @@ async def cleanup_old_attachments_periodically():
             if retention_days > 0:
                 deleted_count = db.delete_old_attachments(retention_days)
                 if deleted_count > 0:
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Cleaned up {deleted_count} old attachments (older than {retention_days} days)")
+                    logger.info("Cleaned up %s old attachments (older than %s days)", deleted_count, retention_days)
         except Exception as e:
-            print(f"Error in attachment cleanup task: {e}")
+            logger.error("Error in attachment cleanup task: %s", e)
 
 
 async def cleanup_reset_tokens_periodically():
@@ -3826,9 +3953,9 @@ async def cleanup_reset_tokens_periodically():
         try:
             await asyncio.sleep(3600)  # Run every hour
             db.cleanup_expired_reset_tokens()
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] Cleaned up expired reset tokens")
+            logger.info("Cleaned up expired reset tokens")
         except Exception as e:
-            print(f"Error in reset token cleanup task: {e}")
+            logger.error("Error in reset token cleanup task: %s", e)
 
 
 async def cleanup_old_messages_periodically():
@@ -3843,7 +3970,7 @@ async def cleanup_old_messages_periodically():
             if dm_purge_days > 0:
                 deleted_count = db.purge_old_dm_messages(dm_purge_days)
                 if deleted_count > 0:
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Purged {deleted_count} DM messages (older than {dm_purge_days} days)")
+                    logger.info("Purged %s DM messages (older than %s days)", deleted_count, dm_purge_days)
             
             # Purge old server messages
             servers_with_schedule = db.get_all_servers_with_purge_schedule()
@@ -3854,13 +3981,14 @@ async def cleanup_old_messages_periodically():
                 
                 deleted_count = db.purge_old_server_messages(server_id, purge_days, exempted_channels)
                 if deleted_count > 0:
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Purged {deleted_count} messages from server {server_id} (older than {purge_days} days)")
+                    logger.info("Purged %s messages from server %s (older than %s days)", deleted_count, server_id, purge_days)
         except Exception as e:
-            print(f"Error in message purge task: {e}")
+            logger.error("Error in message purge task: %s", e)
 
 
 async def main():
     """Start the HTTPS and WebSocket server."""
+    log_listener = setup_logging()
     print("Decentra Chat Server")
     print("=" * 50)
     
@@ -3875,7 +4003,8 @@ async def main():
     
     # Initialize database counters from existing data
     init_counters_from_db()
-    print(f"Initialized counters from database (servers: {server_counter}, channels: {channel_counter}, dms: {dm_counter}, roles: {role_counter})")
+    logger.info("Initialized counters from database (servers: %s, channels: %s, dms: %s, roles: %s)",
+                server_counter, channel_counter, dm_counter, role_counter)
     
     # Create aiohttp application
     app = web.Application()
@@ -3906,8 +4035,14 @@ async def main():
     print("This is normal for local development. Click 'Advanced' and proceed to continue.")
     
     # Keep running
-    await asyncio.Future()
+    try:
+        await asyncio.Future()
+    finally:
+        log_listener.stop()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())